@@ -3,6 +3,9 @@ ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Under ASGI the token and signup endpoints run their password hashing on a
+bounded thread pool, see ``app.asgi_urls`` and ``user.async_views``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 """
@@ -12,5 +15,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'app.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,16 @@
+"""
+URL configuration used when the app is served over ASGI
+
+Routes the password hashing endpoints of the user api to their async
+counterparts and everything else to the regular URL configuration.
+"""
+
+from django.urls import path
+
+from app.urls import urlpatterns as base_urlpatterns
+from user import async_views
+
+urlpatterns = [
+    path("api/user/create/", async_views.create_user),
+    path("api/user/token/", async_views.create_token),
+] + base_urlpatterns
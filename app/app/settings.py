@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "drf_spectacular",
@@ -57,7 +58,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "app.urls"
+# app/asgi.py switches to "app.asgi_urls"
+ROOT_URLCONF = os.environ.get("DJANGO_ROOT_URLCONF", "app.urls")
 
 TEMPLATES = [
     {
@@ -94,6 +96,22 @@ DATABASES = {
 # Custom user model
 AUTH_USER_MODEL = "core.User"
 
+# Password hashing
+# https://docs.djangoproject.com/en/3.2/topics/auth/passwords/
+
+PASSWORD_HASHERS = [
+    "core.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "core.hashers.Argon2PasswordHasher",
+    "core.hashers.BCryptSHA256PasswordHasher",
+]
+
+# hashing cost, see `python manage.py tune_password_hashers`; users are
+# rehashed on their next login after a change
+PASSWORD_PBKDF2_ITERATIONS = 260000
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_BCRYPT_ROUNDS = 12
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -136,11 +154,88 @@ MEDIA_URL = "/static/media/"
 STATIC_ROOT = "/vol/web/static/"
 MEDIA_ROOT = "/vol/web/media/"
 
+# how recipe media is sent once its owner is checked: None streams it from
+# Django, "x-accel-redirect" (nginx) and "x-sendfile" (Apache, lighttpd)
+# hand the transfer to the front proxy. nginx needs an internal location
+# at MEDIA_ACCEL_PREFIX aliasing MEDIA_ROOT
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = "/protected-media/"
+# browser cache lifetime (seconds) of content addressed media files
+MEDIA_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+# on disk, so every process of the host, web and job workers alike, sees
+# the same per-user versions behind cached responses and ETags
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("CACHE_DIR", "/vol/web/cache/"),
+    }
+}
+
+# cache alias and timeout (seconds) of per-user recipe list responses
+RECIPE_CACHE_ALIAS = "default"
+RECIPE_CACHE_TIMEOUT = 300
+
+# size and lifetime (seconds) of the in-process token -> user cache
+TOKEN_AUTH_CACHE_SIZE = 1024
+TOKEN_AUTH_CACHE_TTL = 60
+
+# lifetime (seconds) of the signed access and refresh tokens
+SIGNED_TOKEN_ACCESS_TTL = 5 * 60
+SIGNED_TOKEN_REFRESH_TTL = 7 * 24 * 60 * 60
+
+# threads and queued requests of the pool hashing passwords under ASGI,
+# and the Retry-After (seconds) sent when it is full
+AUTH_HASHING_WORKERS = 4
+AUTH_HASHING_QUEUE_SIZE = 64
+AUTH_HASHING_RETRY_AFTER = 1
+
+# widths (px) and formats of the resized copies of uploaded recipe images,
+# the processes rendering them, and whether to render them inline instead
+RECIPE_IMAGE_VARIANT_WIDTHS = [320, 640, 1280]
+RECIPE_IMAGE_VARIANT_FORMATS = ["webp", "jpeg"]
+RECIPE_IMAGE_WORKERS = 2
+RECIPE_IMAGE_VARIANTS_EAGER = False
+# render variants and delete released image files in run_workers instead
+RECIPE_IMAGE_JOBS = False
+
+# limits on uploaded recipe images, checked from the image header before
+# any pixel is decoded
+RECIPE_IMAGE_FORMATS = ["JPEG", "PNG", "WEBP"]
+RECIPE_IMAGE_MAX_BYTES = 10 * 2 ** 20
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+
+# store recipe images and their variants once per distinct content, named
+# after its SHA-256
+RECIPE_IMAGE_CONTENT_ADDRESSED = True
+
+# widths (px) recipe images are resized to on demand, requested widths are
+# snapped up to one of them, and the directory under MEDIA_ROOT and byte
+# budget of the least recently used cache of the results
+RECIPE_IMAGE_RESIZE_WIDTHS = [160, 320, 480, 640, 960, 1280, 1920]
+RECIPE_IMAGE_RESIZE_DIR = "cache/resized"
+RECIPE_IMAGE_RESIZE_CACHE_BYTES = 512 * 2 ** 20
+
+# background jobs: processes and threads of run_workers, seconds between
+# polls of an empty queue, seconds a running job is leased to its worker
+# before another may take it over, and attempts with exponential backoff
+# (seconds) between them
+JOB_WORKER_PROCESSES = 1
+JOB_WORKER_THREADS = 4
+JOB_POLL_INTERVAL = 1.0
+JOB_LEASE_SECONDS = 300
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF_BASE = 2
+JOB_BACKOFF_MAX = 600
+
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -16,11 +16,12 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import include, path
-from django.conf.urls.static import static
 from django.conf import settings
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from recipe.media import RecipeMediaView
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -32,10 +33,9 @@ urlpatterns = [
     ),
     path("api/user/", include("user.urls")),
     path("api/recipes/", include("recipe.urls")),
+    path(
+        settings.MEDIA_URL.lstrip("/") + "<path:name>",
+        RecipeMediaView.as_view(),
+        name="media",
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL,
-        document_root=settings.MEDIA_ROOT,
-    )
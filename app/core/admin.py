@@ -45,7 +45,21 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RecipeAdmin(admin.ModelAdmin):
+    # Define the admin pages for recipes, leaving images to the upload API
+    # which also replaces their variants and releases the old files
+    readonly_fields = ["image", "image_variants"]
+
+
+class JobAdmin(admin.ModelAdmin):
+    # Define the admin pages for background jobs
+    ordering = ["-id"]
+    list_display = ["id", "name", "status", "attempts", "run_at", "run_time"]
+    list_filter = ["status"]
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
+admin.site.register(models.Recipe, RecipeAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.Job, JobAdmin)
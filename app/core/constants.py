@@ -7,3 +7,15 @@ USER_ROLES = (
     (TYPE_ADMIN, TYPE_ADMIN),
     (TYPE_MODERATOR, TYPE_MODERATOR),
 )
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+JOB_STATUSES = (
+    (JOB_QUEUED, JOB_QUEUED),
+    (JOB_RUNNING, JOB_RUNNING),
+    (JOB_DONE, JOB_DONE),
+    (JOB_FAILED, JOB_FAILED),
+)
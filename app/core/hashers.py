@@ -0,0 +1,44 @@
+"""
+  Password hashers whose cost is read from the settings
+
+Changing PASSWORD_PBKDF2_ITERATIONS, PASSWORD_ARGON2_TIME_COST or
+PASSWORD_BCRYPT_ROUNDS makes Django's must_update() flag existing hashes,
+so every user is rehashed with the new cost the next time they log in.
+See the tune_password_hashers command for picking the values.
+"""
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    # PBKDF2-SHA256 with iterations from PASSWORD_PBKDF2_ITERATIONS
+    @property
+    def iterations(self):
+        return getattr(
+            settings,
+            "PASSWORD_PBKDF2_ITERATIONS",
+            hashers.PBKDF2PasswordHasher.iterations,
+        )
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    # Argon2 with time cost from PASSWORD_ARGON2_TIME_COST
+    @property
+    def time_cost(self):
+        return getattr(
+            settings,
+            "PASSWORD_ARGON2_TIME_COST",
+            hashers.Argon2PasswordHasher.time_cost,
+        )
+
+
+class BCryptSHA256PasswordHasher(hashers.BCryptSHA256PasswordHasher):
+    # bcrypt-SHA256 with work factor from PASSWORD_BCRYPT_ROUNDS
+    @property
+    def rounds(self):
+        return getattr(
+            settings,
+            "PASSWORD_BCRYPT_ROUNDS",
+            hashers.BCryptSHA256PasswordHasher.rounds,
+        )
@@ -0,0 +1,186 @@
+"""
+  Background jobs queued in the database and run by the run_workers command
+"""
+
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import constants
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(func, run_at=None, max_attempts=None, **payload):
+    """Queue a call of func(**payload) and return its job.
+
+    func is a module level function or its dotted path, and payload must
+    be JSON serializable. The job is written in the current transaction,
+    so it only runs if the caller's writes commit.
+    """
+    if callable(func):
+        func = f"{func.__module__}.{func.__qualname__}"
+
+    return Job.objects.create(
+        name=func,
+        payload=payload,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def backoff(attempts):
+    # return the delay before retrying a job that failed attempts times:
+    # exponential, capped, with jitter so retries of a burst spread out
+    delay = min(
+        settings.JOB_BACKOFF_MAX,
+        settings.JOB_BACKOFF_BASE * 2 ** (attempts - 1),
+    )
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim_job():
+    """Take the next due job and return it, or None when there is none.
+
+    The row is locked with SKIP LOCKED so concurrent workers each take a
+    different job without waiting on each other. The job is leased for
+    JOB_LEASE_SECONDS: if its worker dies, it is taken over once the
+    lease expires, or failed when that was its last attempt.
+    """
+    while True:
+        job, expired = _claim_next_job()
+        if not expired:
+            return job
+
+        logger.warning(
+            "Job %s %s failed: lease expired on attempt %d",
+            job.id,
+            job.name,
+            job.attempts,
+        )
+
+
+def _claim_next_job():
+    # claim the next due job, returning it and whether it was instead
+    # failed for running out of attempts, or (None, False)
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.objects.filter(
+                status__in=[constants.JOB_QUEUED, constants.JOB_RUNNING],
+                run_at__lte=now,
+            )
+            .order_by("run_at", "id")
+            .select_for_update(skip_locked=True)
+            .first()
+        )
+        if job is None:
+            return None, False
+
+        if (
+            job.status == constants.JOB_RUNNING
+            and job.attempts >= job.max_attempts
+        ):
+            # its last worker died, likely killed by the job itself
+            job.status = constants.JOB_FAILED
+            job.finished_at = now
+            job.last_error = (
+                f"Lease expired on attempt {job.attempts}, the worker "
+                "stopped before recording an outcome"
+            )
+            job.save(update_fields=["status", "finished_at", "last_error"])
+            return job, True
+
+        if job.queue_time is None:
+            job.queue_time = now - job.created_at
+        job.status = constants.JOB_RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.run_at = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+        job.save(
+            update_fields=[
+                "status",
+                "attempts",
+                "started_at",
+                "run_at",
+                "queue_time",
+            ]
+        )
+
+    return job, False
+
+
+def run_job(job):
+    """Run a claimed job and record its outcome.
+
+    Failed jobs are queued again after a backoff until they run out of
+    attempts. Returns the status the job was left in.
+    """
+    error = ""
+    try:
+        import_string(job.name)(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+
+    finished = timezone.now()
+    fields = {
+        "finished_at": finished,
+        "run_time": finished - job.started_at,
+        "last_error": error,
+    }
+    if not error:
+        fields["status"] = constants.JOB_DONE
+    elif job.attempts >= job.max_attempts:
+        fields["status"] = constants.JOB_FAILED
+    else:
+        fields["status"] = constants.JOB_QUEUED
+        fields["run_at"] = finished + backoff(job.attempts)
+
+    # a worker outliving its lease doesn't overwrite the next attempt
+    Job.objects.filter(
+        id=job.id,
+        status=constants.JOB_RUNNING,
+        attempts=job.attempts,
+    ).update(**fields)
+
+    log = logger.info if not error else logger.warning
+    log(
+        "Job %s %s %s: attempt %d, queued %.3fs, ran %.3fs",
+        job.id,
+        job.name,
+        fields["status"],
+        job.attempts,
+        job.queue_time.total_seconds(),
+        fields["run_time"].total_seconds(),
+    )
+    return fields["status"]
+
+
+def work(stop, poll_interval, burst=False):
+    """Claim and run jobs until stop is set.
+
+    Sleeps poll_interval seconds while no job is due, or returns then
+    with burst. Returns the number of jobs run by status.
+    """
+    counts = {}
+    while not stop.is_set():
+        close_old_connections()
+        job = claim_job()
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+
+        status = run_job(job)
+        counts[status] = counts.get(status, 0) + 1
+
+    close_old_connections()
+    return counts
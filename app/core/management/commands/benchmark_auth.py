@@ -0,0 +1,164 @@
+"""
+Django command comparing recipe read latency during a login storm when the
+app is served over WSGI and over ASGI
+"""
+
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+
+
+def _ms(values, percent):
+    # return the given percentile of a list of durations, in milliseconds
+    if not values:
+        return "n/a"
+
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return f"{values[index] * 1000:.0f}ms"
+
+
+class Command(BaseCommand):
+    # django command benchmarking the WSGI and ASGI serving modes
+    help = (
+        "Fire concurrent logins and recipe reads at the app over WSGI and "
+        "ASGI, and report how much logins slow down the reads."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--logins",
+            type=int,
+            default=20,
+            help="Number of concurrent token requests",
+        )
+        parser.add_argument(
+            "--reads",
+            type=int,
+            default=50,
+            help="Number of concurrent recipe list requests",
+        )
+        parser.add_argument(
+            "--wsgi-threads",
+            type=int,
+            default=8,
+            help="Worker threads of the emulated WSGI server",
+        )
+
+    def handle(self, *args, **options):
+        # entrypoint for command
+        password = uuid.uuid4().hex
+        user = get_user_model().objects.create_user(
+            email=f"bench-{uuid.uuid4().hex}@example.com",
+            password=password,
+        )
+        try:
+            token = Token.objects.create(user=user)
+            Recipe.objects.bulk_create(
+                Recipe(user=user, title=f"Recipe {i}", price="1.00")
+                for i in range(20)
+            )
+            credentials = {"email": user.email, "password": password}
+
+            modes = (("wsgi", self._run_wsgi), ("asgi", self._run_asgi))
+            # the test clients send requests to "testserver"
+            with override_settings(ALLOWED_HOSTS=["testserver"]):
+                for mode, run in modes:
+                    started = time.perf_counter()
+                    logins, reads = run(credentials, token.key, options)
+                    elapsed = time.perf_counter() - started
+                    self._report(mode, elapsed, logins, reads)
+        finally:
+            user.delete()
+
+    def _report(self, mode, elapsed, logins, reads):
+        self.stdout.write(
+            f"{mode}: {elapsed:.2f}s total, "
+            f"login p50 {_ms(logins, 50)}, "
+            f"read p50 {_ms(reads, 50)}, "
+            f"read p95 {_ms(reads, 95)}, "
+            f"read max {_ms(reads, 100)}"
+        )
+
+    def _run_wsgi(self, credentials, token, options):
+        # emulate a threaded WSGI server with a fixed number of workers
+        def login():
+            return self._timed_sync(
+                lambda client: client.post(
+                    reverse("user:token"),
+                    credentials,
+                    content_type="application/json",
+                )
+            )
+
+        def read():
+            return self._timed_sync(
+                lambda client: client.get(
+                    reverse("recipe:recipe-list"),
+                    HTTP_AUTHORIZATION=f"Token {token}",
+                )
+            )
+
+        with ThreadPoolExecutor(options["wsgi_threads"]) as executor:
+            logins = [
+                executor.submit(login) for _ in range(options["logins"])
+            ]
+            reads = [executor.submit(read) for _ in range(options["reads"])]
+            return (
+                [f.result() for f in logins],
+                [f.result() for f in reads],
+            )
+
+    def _timed_sync(self, request):
+        client = Client()
+        started = time.perf_counter()
+        try:
+            request(client)
+            return time.perf_counter() - started
+        finally:
+            close_old_connections()
+
+    def _run_asgi(self, credentials, token, options):
+        # drive the ASGI handler with concurrent requests on one event loop
+        async def timed(request):
+            started = time.perf_counter()
+            await request(AsyncClient())
+            return time.perf_counter() - started
+
+        async def run():
+            logins = [
+                timed(
+                    lambda client: client.post(
+                        reverse("user:token"),
+                        credentials,
+                        content_type="application/json",
+                    )
+                )
+                for _ in range(options["logins"])
+            ]
+            reads = [
+                timed(
+                    lambda client: client.get(
+                        reverse("recipe:recipe-list"),
+                        # AsyncClient takes extra headers by their raw name
+                        AUTHORIZATION=f"Token {token}",
+                    )
+                )
+                for _ in range(options["reads"])
+            ]
+            results = await asyncio.gather(*logins, *reads)
+            return results[: len(logins)], results[len(logins):]
+
+        with override_settings(ROOT_URLCONF="app.asgi_urls"):
+            return asyncio.run(run())
@@ -0,0 +1,228 @@
+"""
+Django command to EXPLAIN the queries behind each API endpoint on seeded
+data and flag sequential scans
+"""
+
+import re
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+class Rollback(Exception):
+    # raised to undo the seeded data once the plans are checked
+    pass
+
+
+class Command(BaseCommand):
+    # django command checking the query plans of the API endpoints
+    help = (
+        "Seed users, recipes, tags and ingredients in a transaction that is "
+        "rolled back, EXPLAIN every query the API endpoints issue and fail "
+        "if any of them sequentially scans a table of --min-table-rows rows "
+        "or more."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=20,
+            help="Number of users to seed",
+        )
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=300,
+            help="Number of recipes to seed per user",
+        )
+        parser.add_argument(
+            "--items",
+            type=int,
+            default=50,
+            help="Number of tags and of ingredients to seed per user",
+        )
+        parser.add_argument(
+            "--min-table-rows",
+            type=int,
+            default=5000,
+            help="Smaller tables are cheaper to scan than to probe, "
+            "sequential scans over them are reported but not flagged",
+        )
+        parser.add_argument(
+            "--verbose-plans",
+            action="store_true",
+            help="Print the full plan of every query",
+        )
+
+    def handle(self, *args, **options):
+        # entrypoint for command
+        self.verbose_plans = options["verbose_plans"]
+        self.min_table_rows = options["min_table_rows"]
+        flagged = []
+        try:
+            with transaction.atomic():
+                user, recipe, tags, ingredients = self._seed(options)
+                with connection.cursor() as cursor:
+                    cursor.execute("ANALYZE")
+                    cursor.execute(
+                        "SELECT relname, reltuples FROM pg_class "
+                        "WHERE relkind = 'r'"
+                    )
+                    self.table_rows = dict(cursor.fetchall())
+
+                # the test client sends requests to "testserver"
+                with override_settings(ALLOWED_HOSTS=["testserver"]):
+                    client = APIClient()
+                    client.force_authenticate(user=user)
+                    for name, url, params in self._endpoints(
+                        recipe,
+                        tags,
+                        ingredients,
+                    ):
+                        flagged += self._check(client, name, url, params)
+                raise Rollback
+        except Rollback:
+            pass
+
+        if flagged:
+            raise CommandError(
+                f"{len(flagged)} sequential scan(s): " + ", ".join(flagged)
+            )
+        self.stdout.write(self.style.SUCCESS("No sequential scans found"))
+
+    def _seed(self, options):
+        # create users with recipes linked to their tags and ingredients,
+        # return the first user with one of their recipes and items
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(email=f"plan-{uuid.uuid4().hex}@example.com")
+            for _ in range(options["users"])
+        )
+        items = options["items"]
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f"Tag {i}")
+            for user in users
+            for i in range(items)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f"Ingredient {i}")
+            for user in users
+            for i in range(items)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f"Recipe {i}",
+                description="Simmer gently",
+                price=Decimal("1.00"),
+            )
+            for user in users
+            for i in range(options["recipes"])
+        )
+
+        # link every recipe to 3 of its owner's tags and ingredients
+        per_user = options["recipes"]
+        tag_links = []
+        ingredient_links = []
+        for index, recipe in enumerate(recipes):
+            first = index // per_user * items
+            for k in range(3):
+                offset = first + (index + k) % items
+                tag_links.append(
+                    Recipe.tags.through(recipe=recipe, tag=tags[offset])
+                )
+                ingredient_links.append(
+                    Recipe.ingredients.through(
+                        recipe=recipe,
+                        ingredient=ingredients[offset],
+                    )
+                )
+        Recipe.tags.through.objects.bulk_create(tag_links)
+        Recipe.ingredients.through.objects.bulk_create(ingredient_links)
+
+        return users[0], recipes[0], tags[:2], ingredients[:2]
+
+    def _endpoints(self, recipe, tags, ingredients):
+        # yield (name, url, query params) for every endpoint to check
+        recipes_url = reverse("recipe:recipe-list")
+        tags_url = reverse("recipe:tag-list")
+        ingredients_url = reverse("recipe:ingredient-list")
+        tag_ids = ",".join(str(tag.id) for tag in tags)
+        ingredient_ids = ",".join(str(i.id) for i in ingredients)
+
+        yield "recipe list", recipes_url, {}
+        yield "recipe list by tags", recipes_url, {"tags": tag_ids}
+        yield "recipe list by all tags", recipes_url, {
+            "tags": tag_ids,
+            "match": "all",
+        }
+        yield "recipe list by ingredients", recipes_url, {
+            "ingredients": ingredient_ids,
+        }
+        yield "recipe search", recipes_url, {"q": "simmer"}
+        yield "recipe detail", reverse(
+            "recipe:recipe-detail",
+            args=[recipe.id],
+        ), {}
+        yield "tag list", tags_url, {}
+        yield "tag list assigned only", tags_url, {"assigned_only": 1}
+        yield "tag list min usage", tags_url, {"min_usage": 2}
+        yield "tag autocomplete", reverse("recipe:tag-autocomplete"), {
+            "q": "tag 1",
+        }
+        yield "ingredient list", ingredients_url, {}
+        yield "ingredient list assigned only", ingredients_url, {
+            "assigned_only": 1,
+        }
+        yield "ingredient autocomplete", reverse(
+            "recipe:ingredient-autocomplete",
+        ), {"q": "ingredient 1"}
+
+    def _check(self, client, name, url, params):
+        # request an endpoint, EXPLAIN its queries and return the flagged
+        # "endpoint: table" entries
+        with CaptureQueriesContext(connection) as ctx:
+            res = client.get(url, params)
+        if res.status_code != 200:
+            raise CommandError(f"{name}: HTTP {res.status_code}")
+
+        flagged = []
+        small = set()
+        for query in ctx.captured_queries:
+            if not query["sql"].startswith("SELECT"):
+                continue
+
+            with connection.cursor() as cursor:
+                cursor.execute("EXPLAIN " + query["sql"])
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+
+            if self.verbose_plans:
+                self.stdout.write(f"{query['sql']}\n{plan}\n")
+            for table in SEQ_SCAN.findall(plan):
+                if self.table_rows.get(table, 0) >= self.min_table_rows:
+                    flagged.append(f"{name}: {table}")
+                else:
+                    small.add(table)
+
+        if flagged:
+            status = self.style.ERROR("SEQ SCAN")
+        elif small:
+            status = f"ok, scans small {', '.join(sorted(small))}"
+        else:
+            status = "ok"
+        self.stdout.write(
+            f"{name}: {len(ctx.captured_queries)} queries, {status}"
+        )
+        return flagged
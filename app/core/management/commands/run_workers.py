@@ -0,0 +1,128 @@
+"""
+Django command to run the background jobs queued in the database
+"""
+
+import contextlib
+import multiprocessing
+import os
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import constants, jobs
+
+
+@contextlib.contextmanager
+def handle_signals(handler):
+    # install handler for SIGINT and SIGTERM, restoring the previous ones
+    previous = {
+        signum: signal.signal(signum, handler)
+        for signum in (signal.SIGINT, signal.SIGTERM)
+    }
+    try:
+        yield
+    finally:
+        for signum, old_handler in previous.items():
+            signal.signal(signum, old_handler)
+
+
+class Command(BaseCommand):
+    # django command running job worker processes and threads
+    help = (
+        "Run --processes worker processes of --threads threads, each "
+        "claiming due jobs from the database with SELECT ... FOR UPDATE "
+        "SKIP LOCKED and running them, until stopped by SIGINT or SIGTERM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=settings.JOB_WORKER_PROCESSES,
+            help="Number of worker processes, for CPU bound jobs",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.JOB_WORKER_THREADS,
+            help="Number of threads per process, for I/O bound jobs",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=settings.JOB_POLL_INTERVAL,
+            help="Seconds to wait before looking again when no job is due",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no job is due instead of waiting for more",
+        )
+
+    def handle(self, *args, **options):
+        # entrypoint for command
+        if options["processes"] <= 1:
+            self._run_process(options)
+            return
+
+        # children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        children = [
+            context.Process(target=self._run_process, args=(options,))
+            for _ in range(options["processes"])
+        ]
+        for child in children:
+            child.start()
+
+        def stop(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    os.kill(child.pid, signal.SIGTERM)
+
+        with handle_signals(stop):
+            for child in children:
+                child.join()
+
+    def _run_process(self, options):
+        # run the worker threads of this process and report what they did
+        stop = threading.Event()
+        results = []
+
+        def work():
+            try:
+                results.append(
+                    jobs.work(
+                        stop,
+                        options["poll_interval"],
+                        burst=options["burst"],
+                    )
+                )
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=work, daemon=True)
+            for _ in range(options["threads"])
+        ]
+        with handle_signals(lambda signum, frame: stop.set()):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                # a timeout keeps the main thread responsive to signals
+                while thread.is_alive():
+                    thread.join(0.5)
+
+        counts = {}
+        for result in results:
+            for status, count in result.items():
+                counts[status] = counts.get(status, 0) + count
+        self.stdout.write(
+            f"Worker {os.getpid()}: {sum(counts.values())} job(s) run, "
+            f"{counts.get(constants.JOB_DONE, 0)} done, "
+            f"{counts.get(constants.JOB_QUEUED, 0)} to retry, "
+            f"{counts.get(constants.JOB_FAILED, 0)} failed"
+        )
@@ -0,0 +1,117 @@
+"""
+Django command to benchmark the password hashers on this host and
+recommend their cost for a target login latency
+"""
+
+import math
+import time
+
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    # django command tuning the password hashing cost
+    help = (
+        "Time the configured password hashers and recommend the cost "
+        "settings that make one hash take --target-ms milliseconds."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=250,
+            help="Time one password hash should take, in milliseconds",
+        )
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=3,
+            help="Runs per measurement, the fastest one is kept",
+        )
+
+    def handle(self, *args, **options):
+        # entrypoint for command
+        target = options["target_ms"] / 1000
+        self.samples = options["samples"]
+        suggestions = {}
+
+        for hasher in hashers.get_hashers():
+            try:
+                line, setting = self._tune(hasher, target)
+            except ValueError:
+                # the hasher's library isn't installed
+                self.stdout.write(
+                    f"{hasher.algorithm}: skipped, library not installed"
+                )
+                continue
+
+            self.stdout.write(f"{hasher.algorithm}: {line}")
+            if setting:
+                suggestions.setdefault(setting[0], setting[1])
+
+        if suggestions:
+            self.stdout.write("")
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Suggested settings for {options['target_ms']:.0f}ms:"
+                )
+            )
+            for name, value in suggestions.items():
+                self.stdout.write(f"{name} = {value}")
+
+    def _time(self, encode):
+        # return the fastest of several runs of encode()
+        timings = []
+        for _ in range(self.samples):
+            started = time.perf_counter()
+            encode()
+            timings.append(time.perf_counter() - started)
+
+        return min(timings)
+
+    def _tune(self, hasher, target):
+        # return a report line and the suggested (setting, value) if any
+        if isinstance(hasher, hashers.PBKDF2PasswordHasher):
+            # cost is linear in the iteration count
+            probe = 20000
+            salt = hasher.salt()
+            elapsed = self._time(lambda: hasher.encode(PASSWORD, salt, probe))
+            iterations = max(1000, round(target * probe / elapsed, -3))
+            line = (
+                f"{elapsed / probe * 1e6:.2f}us per iteration, "
+                f"{hasher.iterations} configured, {iterations:.0f} recommended"
+            )
+            if hasher.algorithm != "pbkdf2_sha256":
+                return line, None
+            return line, ("PASSWORD_PBKDF2_ITERATIONS", int(iterations))
+
+        if isinstance(hasher, hashers.Argon2PasswordHasher):
+            # cost is linear in the number of passes
+            salt = hasher.salt()
+            elapsed = self._time(lambda: hasher.encode(PASSWORD, salt))
+            time_cost = max(1, round(hasher.time_cost * target / elapsed))
+            line = (
+                f"{elapsed * 1000:.0f}ms at time_cost={hasher.time_cost}, "
+                f"{time_cost} recommended"
+            )
+            return line, ("PASSWORD_ARGON2_TIME_COST", time_cost)
+
+        if isinstance(hasher, hashers.BCryptSHA256PasswordHasher):
+            # cost doubles with every round
+            salt = hasher.salt()
+            elapsed = self._time(lambda: hasher.encode(PASSWORD, salt))
+            rounds = hasher.rounds + round(math.log2(target / elapsed))
+            rounds = min(31, max(4, rounds))
+            line = (
+                f"{elapsed * 1000:.0f}ms at rounds={hasher.rounds}, "
+                f"{rounds} recommended"
+            )
+            return line, ("PASSWORD_BCRYPT_ROUNDS", rounds)
+
+        salt = hasher.salt()
+        elapsed = self._time(lambda: hasher.encode(PASSWORD, salt))
+        return f"{elapsed * 1000:.0f}ms per hash, not tunable", None
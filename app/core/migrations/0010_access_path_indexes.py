@@ -0,0 +1,73 @@
+# Generated by Django 3.2.25 on 2026-10-16 22:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# the auto-created through tables only have the (recipe_id, item_id) unique
+# index and single column FK indexes; these let the filters that start from
+# an item read the linked recipe ids with an index-only scan, and replace
+# the item_id FK indexes, which only slowed down writes from then on
+#
+# The migration state deliberately differs from the database here: the
+# through models are auto-created from the M2M fields, so the state has no
+# fields to record db_index=False on (SeparateDatabaseAndState can't reach
+# them without making the through models explicit), and still assumes the
+# FK indexes exist. Later schema changes on these tables look up index
+# names in the database rather than the state, so they cope with the
+# missing ones; a migration recreating the tables must drop them again.
+CREATE_THROUGH_INDEXES = """
+CREATE INDEX core_recipe_tags_tag_recipe_idx
+    ON core_recipe_tags (tag_id) INCLUDE (recipe_id);
+CREATE INDEX core_recipe_ingredients_ingredient_recipe_idx
+    ON core_recipe_ingredients (ingredient_id) INCLUDE (recipe_id);
+DROP INDEX IF EXISTS core_recipe_tags_tag_id_10c0ffea;
+DROP INDEX IF EXISTS core_recipe_ingredients_ingredient_id_a8fec9ee;
+"""
+
+DROP_THROUGH_INDEXES = """
+CREATE INDEX IF NOT EXISTS core_recipe_tags_tag_id_10c0ffea
+    ON core_recipe_tags (tag_id);
+CREATE INDEX IF NOT EXISTS core_recipe_ingredients_ingredient_id_a8fec9ee
+    ON core_recipe_ingredients (ingredient_id);
+DROP INDEX IF EXISTS core_recipe_tags_tag_recipe_idx;
+DROP INDEX IF EXISTS core_recipe_ingredients_ingredient_recipe_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_name_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingredient',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name'], name='ingredient_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='tag_user_name_idx'),
+        ),
+        migrations.RunSQL(CREATE_THROUGH_INDEXES, DROP_THROUGH_INDEXES),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.2.25 on 2026-10-16 23:05
+
+from django.db import migrations
+
+# merge tags/ingredients sharing a name for the same user into the one with
+# the lowest id, before the (user, name) unique constraint is added
+MERGE_DUPLICATES = [
+    # drop the links that would become duplicates once repointed, i.e.
+    # those whose recipe is also linked to a lower id item of the same name
+    """
+    DELETE FROM {through} link
+    USING {items} item, {through} other, {items} kept
+    WHERE link.{column} = item.id
+        AND other.recipe_id = link.recipe_id
+        AND other.{column} = kept.id
+        AND kept.user_id = item.user_id
+        AND kept.name = item.name
+        AND kept.id < item.id
+    """,
+    # repoint the remaining links to the kept item
+    """
+    UPDATE {through} link
+    SET {column} = kept.kept_id
+    FROM (
+        SELECT id, MIN(id) OVER (PARTITION BY user_id, name) AS kept_id
+        FROM {items}
+    ) kept
+    WHERE link.{column} = kept.id AND kept.id <> kept.kept_id
+    """,
+    """
+    DELETE FROM {items} item
+    USING {items} kept
+    WHERE kept.user_id = item.user_id
+        AND kept.name = item.name
+        AND kept.id < item.id
+    """,
+]
+
+
+def merge_duplicates(apps, schema_editor):
+    Recipe = apps.get_model("core", "Recipe")
+    for field in ("tags", "ingredients"):
+        m2m = Recipe._meta.get_field(field)
+        tables = {
+            "through": m2m.remote_field.through._meta.db_table,
+            "items": m2m.related_model._meta.db_table,
+            "column": m2m.m2m_reverse_name(),
+        }
+        for sql in MERGE_DUPLICATES:
+            schema_editor.execute(sql.format(**tables))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -6,7 +6,11 @@ import uuid
 import os
 
 from django.db import models
+from django.db.models.functions import Collate, Upper
 from django.conf import settings
+from django.utils import timezone
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -14,6 +18,7 @@ from django.contrib.auth.models import (
 )
 
 from . import constants
+from .storage import ContentAddressedStorage
 
 
 def recipe_image_file_path(instance, filename):
@@ -71,6 +76,8 @@ class Recipe(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        # covered by the composite indexes leading with user below
+        db_index=False,
     )
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
@@ -79,7 +86,32 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # identical uploads share one file, deleted once no recipe refers to it
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=ContentAddressedStorage(),
+    )
+    # resized copies of image, rendered in the background after upload:
+    # [{"format", "width", "height", "name"}, ...]
+    image_variants = models.JSONField(default=list, blank=True, editable=False)
+    # weighted tsvector of title (A) and description (B), maintained by a
+    # database trigger so bulk writes keep it current too
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # the recipe list: one user's recipes, newest first
+            models.Index(fields=["user", "-id"], name="recipe_user_id_idx"),
+            GinIndex(fields=["search_vector"], name="recipe_search_idx"),
+            # the reference checks before deleting a shared image file
+            models.Index(fields=["image"], name="recipe_image_idx"),
+            GinIndex(
+                fields=["image_variants"],
+                opclasses=["jsonb_path_ops"],
+                name="recipe_image_variants_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -91,8 +123,26 @@ class Tag(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        # covered by the composite indexes leading with user below
+        db_index=False,
     )
 
+    class Meta:
+        constraints = [
+            # also the index of the list, scanned backwards for -name
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="tag_user_name_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                "user",
+                Collate(Upper("name"), "C"),
+                name="tag_name_prefix_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -103,7 +153,65 @@ class Ingredient(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
+        # covered by the composite indexes leading with user below
+        db_index=False,
     )
 
+    class Meta:
+        constraints = [
+            # also the index of the list, scanned backwards for -name
+            models.UniqueConstraint(
+                fields=["user", "name"],
+                name="ingredient_user_name_unique",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                "user",
+                Collate(Upper("name"), "C"),
+                name="ingredient_name_prefix_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.name
+
+
+class Job(models.Model):
+    # background job, run by the run_workers command
+    # dotted path of the function to call, with its keyword arguments
+    name = models.CharField(max_length=255)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(
+        max_length=10,
+        choices=constants.JOB_STATUSES,
+        default=constants.JOB_QUEUED,
+    )
+    # when a queued job may start, or when the lease of a running job
+    # expires and another worker may take it over
+    run_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    last_error = models.TextField(blank=True)
+    # timings: enqueued, latest attempt, time waited before the first
+    # attempt and run time of the latest one
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    queue_time = models.DurationField(null=True, blank=True)
+    run_time = models.DurationField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # the claim query, over pending jobs only
+            models.Index(
+                fields=["run_at", "id"],
+                name="job_pending_idx",
+                condition=models.Q(
+                    status__in=[constants.JOB_QUEUED, constants.JOB_RUNNING],
+                ),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
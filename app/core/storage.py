@@ -0,0 +1,79 @@
+"""
+  Content addressed storage for uploaded files
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection
+from django.utils.deconstruct import deconstructible
+
+
+def lock_file(name):
+    """Lock a stored file name until the end of the transaction.
+
+    Writing a file and deciding to delete it both happen under this lock,
+    so a file is never deleted between being written and being referenced.
+    """
+    digest = hashlib.sha256(name.encode()).digest()
+    key = int.from_bytes(digest[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [key])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after the SHA-256 of their content.
+
+    The name asked for only gives the directory and the extension, so
+    identical files share a single copy. The file is hashed while it is
+    streamed to a temporary file, which is then moved into place unless
+    the same content is already stored. Plain FileSystemStorage behaviour
+    is kept while RECIPE_IMAGE_CONTENT_ADDRESSED is off.
+    """
+
+    @property
+    def enabled(self):
+        return settings.RECIPE_IMAGE_CONTENT_ADDRESSED
+
+    def get_available_name(self, name, max_length=None):
+        # an existing file with the name holds the same content
+        if self.enabled:
+            return name
+
+        return super().get_available_name(name, max_length=max_length)
+
+    def _save(self, name, content):
+        if not self.enabled:
+            return super()._save(name, content)
+
+        directory, basename = os.path.split(name)
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.path(directory))
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            ext = os.path.splitext(basename)[1].lower()
+            name = os.path.join(directory, digest.hexdigest() + ext)
+            lock_file(name)
+            if self.exists(name):
+                os.remove(temp_path)
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(temp_path, self.file_permissions_mode)
+                os.replace(temp_path, self.path(name))
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return name.replace("\\", "/")
@@ -6,6 +6,8 @@ from django.test import TestCase, Client
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from core.models import Recipe
+
 
 class AdminSiteTests(TestCase):
     """Test the admin site"""
@@ -42,3 +44,14 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, 200)
+
+    def test_recipe_image_read_only(self):
+        # test recipe images can't be replaced from the admin
+        recipe = Recipe.objects.create(
+            user=self.user, title="Sample recipe", price="5.00"
+        )
+        url = reverse("admin:core_recipe_change", args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotContains(res, 'name="image"')
@@ -1,10 +1,20 @@
 """Test custom Django management commands"""
 
+from io import StringIO
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from core.models import Recipe
 
 
 @patch("core.management.commands.wait_for_db.Command.check")
@@ -29,3 +39,87 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=["default"])
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+)
+class BenchmarkAuthCommandTests(TransactionTestCase):
+    # Test the WSGI/ASGI auth benchmark command
+    def test_benchmark_auth(self):
+        # Test both serving modes are reported and nothing is left behind
+        out = StringIO()
+
+        call_command("benchmark_auth", logins=2, reads=2, stdout=out)
+
+        self.assertIn("wsgi:", out.getvalue())
+        self.assertIn("asgi:", out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class CheckQueryPlansCommandTests(TestCase):
+    # Test the query plan check command
+    def test_check_query_plans(self):
+        # Test every endpoint is checked and the seeded data rolled back
+        out = StringIO()
+
+        call_command(
+            "check_query_plans",
+            users=2,
+            recipes=30,
+            items=5,
+            stdout=out,
+        )
+
+        self.assertIn("recipe list: 3 queries", out.getvalue())
+        self.assertIn("ingredient autocomplete:", out.getvalue())
+        self.assertIn("No sequential scans found", out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_sequential_scans_flagged(self):
+        # Test sequential scans over large enough tables fail the check
+        with self.assertRaisesMessage(CommandError, "sequential scan"):
+            call_command(
+                "check_query_plans",
+                users=2,
+                recipes=30,
+                items=5,
+                min_table_rows=0,
+                stdout=StringIO(),
+            )
+
+
+class TunePasswordHashersCommandTests(SimpleTestCase):
+    # Test the password hasher tuning command
+    @override_settings(
+        PASSWORD_HASHERS=["core.hashers.PBKDF2PasswordHasher"],
+    )
+    @patch("core.management.commands.tune_password_hashers.time.perf_counter")
+    def test_recommend_pbkdf2_iterations(self, patched_perf_counter):
+        # Test iterations are scaled to hit the target latency
+        # 20000 probe iterations take 50ms, so 200ms needs 80000
+        patched_perf_counter.side_effect = [0, 0.05]
+        out = StringIO()
+
+        call_command(
+            "tune_password_hashers",
+            target_ms=200,
+            samples=1,
+            stdout=out,
+        )
+
+        self.assertIn("PASSWORD_PBKDF2_ITERATIONS = 80000", out.getvalue())
+
+    @override_settings(
+        PASSWORD_HASHERS=["core.hashers.BCryptSHA256PasswordHasher"],
+    )
+    @patch("django.contrib.auth.hashers.BCryptSHA256PasswordHasher.salt")
+    def test_missing_library_skipped(self, patched_salt):
+        # Test hashers without their library are reported as skipped
+        patched_salt.side_effect = ValueError
+        out = StringIO()
+
+        call_command("tune_password_hashers", samples=1, stdout=out)
+
+        self.assertIn("bcrypt_sha256: skipped", out.getvalue())
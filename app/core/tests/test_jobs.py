@@ -0,0 +1,224 @@
+"""
+  Tests for the background jobs
+"""
+
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import constants, jobs
+from core.models import Job
+
+CALLS = []
+
+
+def record(**payload):
+    # job recording its payload
+    CALLS.append(payload)
+
+
+def fail(**payload):
+    # job always failing
+    raise ValueError("job failed")
+
+
+class JobTests(TestCase):
+    # test queueing, claiming and running jobs
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue(self):
+        # test jobs are queued by function or dotted path
+        job = jobs.enqueue(record, value=1)
+        other = jobs.enqueue("core.tests.test_jobs.record")
+
+        self.assertEqual(job.name, "core.tests.test_jobs.record")
+        self.assertEqual(job.payload, {"value": 1})
+        self.assertEqual(job.status, constants.JOB_QUEUED)
+        self.assertEqual(other.name, job.name)
+
+    def test_claim_due_jobs_in_order(self):
+        # test only due jobs are claimed, oldest first, and leased
+        later = jobs.enqueue(record, run_at=timezone.now() + timedelta(1))
+        first = jobs.enqueue(record)
+        second = jobs.enqueue(record)
+
+        claimed = [jobs.claim_job(), jobs.claim_job(), jobs.claim_job()]
+
+        self.assertEqual(claimed, [first, second, None])
+        first.refresh_from_db()
+        self.assertEqual(first.status, constants.JOB_RUNNING)
+        self.assertEqual(first.attempts, 1)
+        self.assertGreater(first.run_at, timezone.now())
+        self.assertIsNotNone(first.queue_time)
+        later.refresh_from_db()
+        self.assertEqual(later.status, constants.JOB_QUEUED)
+
+    def test_expired_lease_taken_over(self):
+        # test a running job whose lease expired is claimed again
+        job = jobs.enqueue(record)
+        jobs.claim_job()
+        Job.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+
+        claimed = jobs.claim_job()
+
+        self.assertEqual(claimed, job)
+        self.assertEqual(claimed.attempts, 2)
+
+    def test_expired_lease_on_last_attempt_failed(self):
+        # test a job whose worker died on its last attempt is failed, not
+        # taken over again, and the next due job is claimed instead
+        job = jobs.enqueue(record, max_attempts=1)
+        jobs.claim_job()
+        Job.objects.update(run_at=timezone.now() - timedelta(seconds=1))
+        other = jobs.enqueue(record)
+
+        with self.assertLogs("core.jobs", "WARNING"):
+            claimed = jobs.claim_job()
+
+        self.assertEqual(claimed, other)
+        job.refresh_from_db()
+        self.assertEqual(job.status, constants.JOB_FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("Lease expired", job.last_error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_run_success(self):
+        # test a successful job is called and timed
+        jobs.enqueue(record, value=1)
+
+        status = jobs.run_job(jobs.claim_job())
+
+        self.assertEqual(status, constants.JOB_DONE)
+        self.assertEqual(CALLS, [{"value": 1}])
+        job = Job.objects.get()
+        self.assertEqual(job.status, constants.JOB_DONE)
+        self.assertIsNotNone(job.finished_at)
+        self.assertGreaterEqual(job.run_time, timedelta(0))
+
+    def test_retry_with_backoff(self):
+        # test failed jobs are retried later, until out of attempts
+        jobs.enqueue(fail, max_attempts=2)
+
+        with self.assertLogs("core.jobs", "WARNING"):
+            status = jobs.run_job(jobs.claim_job())
+
+        self.assertEqual(status, constants.JOB_QUEUED)
+        job = Job.objects.get()
+        self.assertIn("ValueError: job failed", job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(jobs.claim_job())
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs("core.jobs", "WARNING"):
+            status = jobs.run_job(jobs.claim_job())
+
+        self.assertEqual(status, constants.JOB_FAILED)
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(jobs.claim_job())
+
+    def test_outlived_lease_not_recorded(self):
+        # test a worker finishing after its job was taken over doesn't
+        # overwrite the new attempt
+        jobs.enqueue(record)
+        stale = jobs.claim_job()
+        Job.objects.update(run_at=timezone.now())
+        jobs.claim_job()
+
+        jobs.run_job(stale)
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, constants.JOB_RUNNING)
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(JOB_BACKOFF_BASE=2, JOB_BACKOFF_MAX=60)
+    def test_backoff(self):
+        # test the delay doubles per attempt, with jitter, up to a cap
+        for attempts, delay in [(1, 2), (2, 4), (3, 8), (10, 60)]:
+            with self.subTest(attempts=attempts):
+                seconds = jobs.backoff(attempts).total_seconds()
+                self.assertGreaterEqual(seconds, delay / 2)
+                self.assertLessEqual(seconds, delay)
+
+
+class SkipLockedTests(TransactionTestCase):
+    # test concurrent workers claiming jobs
+    def test_locked_job_skipped(self):
+        # test a job locked by another worker is skipped, not waited for
+        first = jobs.enqueue(record)
+        second = jobs.enqueue(record)
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(id=first.id)
+                    locked.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        locked.wait(5)
+        try:
+            claimed = jobs.claim_job()
+        finally:
+            release.set()
+            thread.join(5)
+
+        self.assertEqual(claimed, second)
+
+
+class RunWorkersCommandTests(TransactionTestCase):
+    # test the run_workers command
+    def setUp(self):
+        CALLS.clear()
+
+    def test_threads(self):
+        # test worker threads run every due job, once
+        for value in range(10):
+            jobs.enqueue(record, value=value)
+        jobs.enqueue(fail, max_attempts=1)
+        out = StringIO()
+
+        with self.assertLogs("core.jobs", "WARNING"):
+            call_command("run_workers", threads=3, burst=True, stdout=out)
+
+        self.assertEqual(
+            sorted(call["value"] for call in CALLS),
+            list(range(10)),
+        )
+        self.assertEqual(
+            Job.objects.filter(status=constants.JOB_DONE).count(),
+            10,
+        )
+        self.assertIn(
+            "11 job(s) run, 10 done, 0 to retry, 1 failed",
+            out.getvalue(),
+        )
+
+    def test_processes(self):
+        # test worker processes share the queue
+        for value in range(6):
+            jobs.enqueue(record, value=value)
+
+        call_command(
+            "run_workers",
+            processes=2,
+            threads=2,
+            burst=True,
+            stdout=StringIO(),
+        )
+
+        self.assertFalse(
+            Job.objects.exclude(status=constants.JOB_DONE).exists(),
+        )
+        self.assertEqual(Job.objects.filter(attempts=1).count(), 6)
@@ -0,0 +1,175 @@
+"""
+  Per-user response caching for the recipe APIs
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import parse_etags, patch_cache_control
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_cache():
+    # return the cache backend used for recipe responses
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f"recipe:version:{user_id}"
+
+
+def get_user_version(user_id):
+    # return the current change version of a user's recipe data
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # start from the clock rather than 1, so a counter that was evicted
+        # never hands out a version that is still cached
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def _bump(user_id):
+    cache = get_cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+    else:
+        # backends without a native incr set the new value with the
+        # default timeout, the version must not expire
+        cache.touch(key, None)
+
+
+def bump_user_version(user_id):
+    # mark every cached response of a user as stale, now and again once
+    # the current transaction commits, so no reader can cache data from
+    # before the write under the new version
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
+
+
+def normalize_ids(value):
+    # normalize a comma separated list of IDs for use in a cache key
+    try:
+        return ",".join(
+            str(i) for i in sorted({int(v) for v in value.split(",")})
+        )
+    except ValueError:
+        return value
+
+
+def normalize_flag(value):
+    # normalize a 0/1 query param for use in a cache key
+    try:
+        return str(int(bool(int(value))))
+    except ValueError:
+        return value
+
+
+class CachedListMixin:
+    """Cache list responses per user, action and query params.
+
+    Cached entries are keyed on the user's change version, which is bumped
+    whenever one of their recipes, tags or ingredients is written, so a
+    write makes every older entry unreachable.
+    """
+
+    # query params that change the list response, mapped to the function
+    # normalizing their value in the cache key
+    cache_query_params = {}
+
+    def get_cache_key(self, request):
+        # build the cache key of the current list request
+        params = []
+        for name, normalize in sorted(self.cache_query_params.items()):
+            value = request.query_params.get(name)
+            if value is not None:
+                params.append(f"{name}={normalize(value)}")
+        # paginated responses embed absolute links to the other pages
+        params.append(request.get_host())
+        digest = hashlib.md5("&".join(params).encode()).hexdigest()
+
+        user_id = request.user.id
+        version = get_user_version(user_id)
+        return (
+            f"recipe:response:{user_id}:{version}:"
+            f"{self.basename}:{self.action}:{digest}"
+        )
+
+    def list(self, request, *args, **kwargs):
+        # serve the list from the cache when possible
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+
+        return response
+
+
+class ConditionalGetMixin:
+    """Answer GET requests with strong ETags and 304 Not Modified.
+
+    The ETag is derived from the user's change version, the full request
+    path and the negotiated media type, so it can be checked without
+    running the queryset or the serializer.
+    """
+
+    def get_etag(self, request):
+        # return the ETag of the current GET request
+        user_id = request.user.id
+        version = get_user_version(user_id)
+        digest = hashlib.md5(
+            f"{request.get_full_path()}|{request.accepted_media_type}".encode()
+        ).hexdigest()
+        return f'"{user_id}-{version}-{digest}"'
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        # call the handler unless the client's copy is still current
+        etag = self.get_etag(request)
+        etags = [
+            tag[2:] if tag.startswith("W/") else tag
+            for tag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+        ]
+        if etag in etags:
+            return self._not_modified(etag)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            # "*" only matches once the handler found the resource
+            if "*" in etags:
+                return self._not_modified(etag)
+            response["ETag"] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+
+        return response
+
+    def _not_modified(self, etag):
+        # return the 304 answering a matching If-None-Match
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # list with conditional GET support
+        return self.conditional_response(
+            super().list,
+            request,
+            *args,
+            **kwargs,
+        )
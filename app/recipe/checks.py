@@ -0,0 +1,32 @@
+"""
+  System checks for the recipe app settings
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# cache backends whose data other processes never see
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+@register(Tags.caches)
+def check_shared_recipe_cache(app_configs, **kwargs):
+    # job workers write images in their own process, so the versions they
+    # bump must be seen by the web processes
+    alias = settings.RECIPE_CACHE_ALIAS
+    backend = settings.CACHES.get(alias, {}).get("BACKEND")
+    if settings.RECIPE_IMAGE_JOBS and backend in PROCESS_LOCAL_CACHES:
+        return [
+            Error(
+                f"RECIPE_IMAGE_JOBS needs the {alias!r} cache to be shared "
+                "by every process, not a process-local backend.",
+                hint="Use a file, database or memcached/redis backend.",
+                obj=backend,
+                id="recipe.E001",
+            )
+        ]
+
+    return []
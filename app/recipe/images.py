@@ -0,0 +1,265 @@
+"""
+  Background generation of resized recipe image variants
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import Q
+
+from PIL import Image, ImageOps, features
+
+from core import jobs
+from core.models import Recipe
+from core.storage import lock_file
+from recipe.cache import bump_user_version
+
+logger = logging.getLogger(__name__)
+
+# Pillow format, save options and file extension of each variant format
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}, "webp"),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True}, "jpg"),
+}
+
+# Pillow feature needed to encode each variant format
+FORMAT_FEATURES = {"webp": "webp", "jpeg": "jpg"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool():
+    # return the process-wide pool rendering image variants
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+            )
+
+    return _pool
+
+
+def supported_formats(formats):
+    # return the formats this Pillow build can encode, webp needing libwebp
+    return [name for name in formats if features.check(FORMAT_FEATURES[name])]
+
+
+def _normalize_mode(image, image_format):
+    # convert palette, CMYK, 16 bit... images to a mode the format saves
+    has_alpha = "A" in image.getbands() or "transparency" in image.info
+    if image_format == "JPEG":
+        if has_alpha:
+            # flatten transparent areas on white
+            rgba = image.convert("RGBA")
+            flat = Image.new("RGB", rgba.size, "white")
+            flat.paste(rgba, mask=rgba.getchannel("A"))
+            return flat
+        return image if image.mode == "RGB" else image.convert("RGB")
+
+    mode = "RGBA" if has_alpha else "RGB"
+    return image if image.mode == mode else image.convert(mode)
+
+
+def render_variants(data, widths, formats):
+    """Render the resized variants of an encoded image.
+
+    Runs in a worker process. Variants are never wider than the original,
+    are rotated according to its EXIF orientation and are saved without
+    any of its metadata. Returns a list of (format, width, height, data).
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        # let JPEGs decode straight to the smallest scale still at least
+        # as large as the widest variant, whatever their orientation
+        widest = max(widths)
+        original.draft(None, (widest, widest))
+        image = ImageOps.exif_transpose(original)
+        image.load()
+
+    variants = []
+    for width in sorted({min(width, image.width) for width in widths}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image
+        if width != image.width:
+            resized = image.resize((width, height), Image.LANCZOS)
+
+        for name in formats:
+            image_format, options, _ = FORMATS[name]
+            buffer = io.BytesIO()
+            _normalize_mode(resized, image_format).save(
+                buffer,
+                format=image_format,
+                **options,
+            )
+            variants.append((name, width, height, buffer.getvalue()))
+
+    return variants
+
+
+def render_resized(data, width, image_format):
+    # render one resized copy of an encoded image in the pool, or inline
+    # with RECIPE_IMAGE_VARIANTS_EAGER, and return its data
+    args = (data, [width], [image_format])
+    if settings.RECIPE_IMAGE_VARIANTS_EAGER:
+        rendered = render_variants(*args)
+    else:
+        rendered = get_image_pool().submit(render_variants, *args).result()
+
+    return rendered[0][3]
+
+
+def file_names(recipe):
+    # return the names of the stored image and variants of a recipe
+    names = [variant["name"] for variant in recipe.image_variants]
+    if recipe.image:
+        names.insert(0, recipe.image.name)
+    return names
+
+
+def release_files(names):
+    """Delete the files no recipe image or variant refers to anymore.
+
+    Identical images share one file, so a file's reference count is the
+    number of recipes naming it, counted under the lock the storage takes
+    while writing it. Returns the names of the deleted files.
+    """
+    storage = Recipe._meta.get_field("image").storage
+    deleted = []
+    for name in dict.fromkeys(names):
+        with transaction.atomic():
+            lock_file(name)
+            referenced = Recipe.objects.filter(
+                Q(image=name) | Q(image_variants__contains=[{"name": name}]),
+            ).exists()
+            if not referenced:
+                storage.delete(name)
+                deleted.append(name)
+
+    return deleted
+
+
+def release_on_commit(names):
+    # release files once the transaction dropping their reference commits,
+    # or queue a job doing so with RECIPE_IMAGE_JOBS
+    names = list(names)
+    if not names:
+        return
+
+    if settings.RECIPE_IMAGE_JOBS:
+        jobs.enqueue(release_files, names=names)
+    else:
+        transaction.on_commit(lambda: release_files(names))
+
+
+def store_variants(recipe_id, image_name, rendered):
+    # save rendered variants next to the original and record them on the
+    # recipe, unless its image was replaced in the meantime
+    storage = Recipe._meta.get_field("image").storage
+    root = os.path.splitext(image_name)[0]
+    variants = []
+    with transaction.atomic():
+        for name, width, height, data in rendered:
+            path = storage.save(
+                f"{root}-{width}w.{FORMATS[name][2]}",
+                ContentFile(data),
+            )
+            variants.append(
+                {
+                    "format": name,
+                    "width": width,
+                    "height": height,
+                    "name": path,
+                }
+            )
+
+        recipes = Recipe.objects.filter(id=recipe_id, image=image_name)
+        user_ids = list(recipes.values_list("user_id", flat=True))
+        stored = user_ids and recipes.update(image_variants=variants)
+
+    if not stored:
+        # other recipes may share the files of identical variants
+        release_files(variant["name"] for variant in variants)
+        return []
+
+    # update() sends no signals, invalidate cached responses here
+    bump_user_version(user_ids[0])
+    return variants
+
+
+def _on_rendered(recipe_id, image_name, stored, future):
+    # runs on the pool's result thread once the variants are rendered
+    try:
+        stored.set_result(
+            store_variants(recipe_id, image_name, future.result()),
+        )
+    except Exception as exc:
+        logger.exception("Failed to render variants of %s", image_name)
+        stored.set_exception(exc)
+    finally:
+        connections.close_all()
+
+
+def _render_args(image_name):
+    # return the arguments of render_variants for a stored image
+    formats = supported_formats(settings.RECIPE_IMAGE_VARIANT_FORMATS)
+    if len(formats) < len(settings.RECIPE_IMAGE_VARIANT_FORMATS):
+        logger.warning(
+            "Pillow can't encode every variant format, only rendering %s",
+            ", ".join(formats),
+        )
+
+    storage = Recipe._meta.get_field("image").storage
+    with storage.open(image_name, "rb") as image_file:
+        return (
+            image_file.read(),
+            settings.RECIPE_IMAGE_VARIANT_WIDTHS,
+            formats,
+        )
+
+
+def generate_variants(recipe_id, image_name):
+    # job rendering and storing the variants of a recipe image
+    rendered = render_variants(*_render_args(image_name))
+    return store_variants(recipe_id, image_name, rendered)
+
+
+def submit_variants(recipe_id, image_name):
+    """Render and store the variants of a recipe image.
+
+    Returns a future resolved with the stored variants. With
+    RECIPE_IMAGE_VARIANTS_EAGER the work is done before returning.
+    """
+    args = _render_args(image_name)
+    stored = Future()
+    if settings.RECIPE_IMAGE_VARIANTS_EAGER:
+        stored.set_result(
+            store_variants(recipe_id, image_name, render_variants(*args)),
+        )
+        return stored
+
+    future = get_image_pool().submit(render_variants, *args)
+    future.add_done_callback(
+        lambda future: _on_rendered(recipe_id, image_name, stored, future),
+    )
+    return stored
+
+
+def schedule_variants(recipe):
+    # render the variants of the recipe's image once the upload commits,
+    # in the image pool or, with RECIPE_IMAGE_JOBS, in a queued job
+    recipe_id, image_name = recipe.id, recipe.image.name
+    if settings.RECIPE_IMAGE_JOBS:
+        jobs.enqueue(
+            generate_variants,
+            recipe_id=recipe_id,
+            image_name=image_name,
+        )
+    else:
+        transaction.on_commit(lambda: submit_variants(recipe_id, image_name))
@@ -0,0 +1,86 @@
+"""
+Django command to move existing recipe images and variants to content
+addressed names, deleting the duplicates left unreferenced
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipe
+from recipe import images
+
+
+class Command(BaseCommand):
+    # django command deduplicating the stored recipe images
+    help = (
+        "Rename every recipe image and variant after the SHA-256 of its "
+        "content, so identical files share one copy, and delete the files "
+        "no recipe refers to afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of recipe ids read from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        # entrypoint for command
+        if not settings.RECIPE_IMAGE_CONTENT_ADDRESSED:
+            raise CommandError("RECIPE_IMAGE_CONTENT_ADDRESSED is off")
+
+        self.storage = Recipe._meta.get_field("image").storage
+        recipe_ids = (
+            Recipe.objects.exclude(image="")
+            .exclude(image__isnull=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+        renamed = 0
+        deleted = []
+        freed = 0
+        for recipe_id in recipe_ids.iterator(options["batch_size"]):
+            old_names = self._rename(recipe_id)
+            if old_names:
+                renamed += 1
+                sizes = {name: self.storage.size(name) for name in old_names}
+                for name in images.release_files(old_names):
+                    deleted.append(name)
+                    freed += sizes[name]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Renamed the files of {renamed} recipe(s), deleted "
+                f"{len(deleted)} duplicate file(s), {freed} bytes freed"
+            )
+        )
+
+    def _rename(self, recipe_id):
+        # store a recipe's files under their content name and return the
+        # names they no longer go by
+        with transaction.atomic():
+            recipe = Recipe.objects.select_for_update().get(id=recipe_id)
+            names = {}
+            for name in images.file_names(recipe):
+                if not self.storage.exists(name):
+                    self.stderr.write(f"Recipe {recipe_id}: {name} missing")
+                    continue
+
+                # saving known content only returns its name
+                with self.storage.open(name, "rb") as stored:
+                    names[name] = self.storage.save(name, stored)
+
+            renamed = {old: new for old, new in names.items() if old != new}
+            if not renamed:
+                return []
+
+            recipe.image.name = names.get(recipe.image.name, recipe.image.name)
+            for variant in recipe.image_variants:
+                variant["name"] = names.get(variant["name"], variant["name"])
+            # saved with signals, cached responses hold the old URLs
+            recipe.save(update_fields=["image", "image_variants"])
+
+        return list(renamed)
@@ -0,0 +1,227 @@
+"""
+  Serving recipe image files to their owners
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db.models import Q
+from django.http import FileResponse, Http404, HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils.cache import parse_etags, patch_cache_control
+from django.utils.encoding import iri_to_uri
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from drf_spectacular.utils import extend_schema, OpenApiTypes
+
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.views import APIView
+
+from core.models import Recipe
+from recipe import images
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+
+# names given by the content addressed storage, which never change content
+CONTENT_NAME = re.compile(r"^[0-9a-f]{64}(\.\w+)?$")
+# a single byte range, other forms are ignored and the whole file is sent
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 2 ** 10
+# content types of the variant formats, which the stdlib table lacks
+# before Python 3.11 (webp) when the system has no mime.types
+IMAGE_TYPES = {
+    f".{extension}": f"image/{name}"
+    for name, (_, _, extension) in images.FORMATS.items()
+}
+
+
+class UnsatisfiableRange(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """Return the (start, end) bytes, inclusive, a Range header asks for.
+
+    Returns None when the whole file should be sent instead, and raises
+    UnsatisfiableRange when the range starts past the end of the file.
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+
+    start, end = match.groups()
+    if not start:
+        # the last `end` bytes
+        if not int(end):
+            raise UnsatisfiableRange()
+        return max(0, size - int(end)), size - 1
+
+    start = int(start)
+    if start >= size:
+        raise UnsatisfiableRange()
+    end = int(end) if end else size - 1
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def read_range(path, start, length):
+    # yield length bytes of the file at path, from start
+    with open(path, "rb") as stored:
+        stored.seek(start)
+        while length > 0:
+            chunk = stored.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def is_content_name(name):
+    # return whether a stored file is named after its content
+    return bool(CONTENT_NAME.match(os.path.basename(name)))
+
+
+def file_response(request, name, path, immutable=None):
+    """Return the response sending a media file.
+
+    With MEDIA_SENDFILE set, the front proxy is told to send the file
+    itself, ranges included. Otherwise it is streamed from here, honouring
+    If-None-Match, If-Modified-Since and single byte Range requests.
+    Immutable files, by default those named after their content, may be
+    cached for good.
+    """
+    if immutable is None:
+        immutable = is_content_name(name)
+    stat = os.stat(path)
+    last_modified = http_date(stat.st_mtime)
+    # a name reused for another file gets another ETag, even when the
+    # other file is older than the client's copy
+    etag = '"%s"' % hashlib.md5(
+        f"{name}|{stat.st_mtime_ns}|{stat.st_size}".encode()
+    ).hexdigest()
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        not_modified = etag in etags or "*" in etags
+    else:
+        not_modified = not was_modified_since(
+            request.META.get("HTTP_IF_MODIFIED_SINCE"),
+            stat.st_mtime,
+            stat.st_size,
+        )
+
+    if not_modified:
+        response = HttpResponse(status=304)
+    elif settings.MEDIA_SENDFILE == "x-accel-redirect":
+        response = HttpResponse()
+        response["X-Accel-Redirect"] = iri_to_uri(
+            settings.MEDIA_ACCEL_PREFIX + name,
+        )
+    elif settings.MEDIA_SENDFILE == "x-sendfile":
+        response = HttpResponse()
+        response["X-Sendfile"] = path
+    else:
+        response = _stream(request, path, stat.st_size, last_modified)
+
+    content_type = (
+        IMAGE_TYPES.get(os.path.splitext(name)[1].lower())
+        or mimetypes.guess_type(name)[0]
+    )
+    response["Content-Type"] = content_type or "application/octet-stream"
+    response["Last-Modified"] = last_modified
+    response["ETag"] = etag
+    if immutable:
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=settings.MEDIA_IMMUTABLE_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        # the name may be reused, revalidate with If-None-Match
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _stream(request, path, size, last_modified):
+    # return the response streaming the file, or the range asked for
+    byte_range = None
+    header = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if header and (if_range is None or if_range == last_modified):
+        try:
+            byte_range = parse_range(header, size)
+        except UnsatisfiableRange:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"))
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(path, start, end - start + 1),
+            status=206,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    # files are sent as they are stored, whatever the client accepts
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class RecipeMediaView(APIView):
+    """Send recipe images and variants to the owner of the recipe"""
+
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(
+        responses={
+            (200, "application/octet-stream"): OpenApiTypes.BINARY,
+            (206, "application/octet-stream"): OpenApiTypes.BINARY,
+            304: None,
+            416: None,
+        },
+    )
+    def get(self, request, name):
+        # files shared by identical uploads are sent to every owner, and
+        # to nobody else, not even to tell they exist
+        owned = Recipe.objects.filter(
+            Q(image=name) | Q(image_variants__contains=[{"name": name}]),
+            user=request.user,
+        )
+        if not owned.exists():
+            raise Http404
+
+        storage = Recipe._meta.get_field("image").storage
+        try:
+            path = storage.path(name)
+            return file_response(request, name, path)
+        except (FileNotFoundError, SuspiciousFileOperation):
+            raise Http404
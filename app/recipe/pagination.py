@@ -0,0 +1,27 @@
+"""
+  Pagination classes for the recipe APIs
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset pagination over recipes, newest first.
+
+    Pages are addressed by an opaque cursor encoding the last seen id, so
+    every page is an indexed range scan on the primary key and no
+    COUNT(*) is ever issued.
+    """
+
+    ordering = "-id"
+    page_size = 25
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        # search results are ranked, ties broken by id to keep the cursor
+        # stable
+        if view is not None and view.get_search_terms():
+            return ("-rank", "-id")
+
+        return super().get_ordering(request, queryset, view)
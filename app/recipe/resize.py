@@ -0,0 +1,186 @@
+"""
+  On demand resized recipe images, cached on disk
+"""
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import transaction
+
+from core.models import Recipe
+from core.storage import lock_file
+from recipe import images
+
+
+class DiskLRUCache:
+    """Files kept under a byte budget, evicting the least recently used.
+
+    Recency is the access time of a file, set on every hit. The total
+    size is tracked in process and recounted from the directory whenever
+    it goes over budget, so processes sharing the directory converge.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._size = None
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def get(self, name):
+        # return the path of a cached file, marking it used, or None
+        path = self.path(name)
+        try:
+            stat = os.stat(path)
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def put(self, name, data):
+        # cache data as name and return its path
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as temp_file:
+                temp_file.write(data)
+            os.chmod(temp_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+            os.replace(temp_path, self.path(name))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(data)
+            if self._size is None or self._size > self.max_bytes:
+                self._size = self._evict(keep=name)
+
+        return self.path(name)
+
+    def _evict(self, keep):
+        # delete the least recently used files until under budget, never
+        # the one just written, and return the size left
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                # skip files still being written
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, entry.name))
+
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, name in sorted(entries):
+            if size <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+            size -= file_size
+
+        return size
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_resize_cache():
+    # return the cache of resized images for the current settings
+    key = (
+        os.path.join(settings.MEDIA_ROOT, settings.RECIPE_IMAGE_RESIZE_DIR),
+        settings.RECIPE_IMAGE_RESIZE_CACHE_BYTES,
+    )
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = DiskLRUCache(*key)
+
+    return _caches[key]
+
+
+def snap_width(width=None):
+    # return the smallest allowed width at least as wide as width, or the
+    # widest allowed one
+    widths = sorted(settings.RECIPE_IMAGE_RESIZE_WIDTHS)
+    if width is None:
+        return widths[-1]
+
+    wider = (allowed for allowed in widths if allowed >= width)
+    return next(wider, widths[-1])
+
+
+def single_flight(key, produce):
+    """Return produce(), called once for concurrent calls with the same key.
+
+    The first caller produces the result, the others in this process wait
+    for it and share it, or its exception.
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+
+    if not leader:
+        return future.result()
+
+    try:
+        result = produce()
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+
+
+def resized_image(image_name, width, image_format):
+    """Return the (media name, path) of an image resized to width.
+
+    Images are resized once: concurrent requests in a process share one
+    render, and processes wait on the lock of the cached name and find
+    the file rendered by whichever took it first.
+    """
+    cache = get_resize_cache()
+    root = os.path.splitext(os.path.basename(image_name))[0]
+    name = f"{root}-{width}w.{images.FORMATS[image_format][2]}"
+    media_name = f"{settings.RECIPE_IMAGE_RESIZE_DIR}/{name}"
+
+    def produce():
+        with transaction.atomic():
+            lock_file(media_name)
+            path = cache.get(name)
+            if path:
+                return path
+
+            storage = Recipe._meta.get_field("image").storage
+            with storage.open(image_name, "rb") as image_file:
+                data = image_file.read()
+            return cache.put(
+                name,
+                images.render_resized(data, width, image_format),
+            )
+
+    path = cache.get(name)
+    if path is None:
+        path = single_flight(name, produce)
+    return media_name, path
@@ -2,24 +2,156 @@
   serializers for Recipe APIs
 """
 
+from django.db import connection, transaction
+from django.db.models import prefetch_related_objects
+
+from drf_spectacular.utils import extend_schema_field
+
 from rest_framework import serializers
 
 from core.models import Ingredient, Recipe, Tag
+from recipe.cache import bump_user_version
+from recipe.uploads import BoundedImageField
+
+
+def insert_names(model, user, names):
+    # insert the user's tags or ingredients named names, skipping the ones
+    # that already exist, and return a {name: object} mapping of the
+    # inserted rows
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, name) "
+            "SELECT %s, unnest(%s::varchar[]) "
+            "ON CONFLICT (user_id, name) DO NOTHING "
+            "RETURNING id, name",
+            [user.id, names],
+        )
+        rows = cursor.fetchall()
+
+    inserted = {}
+    for pk, name in rows:
+        obj = model(id=pk, user=user, name=name)
+        obj._state.adding = False
+        obj._state.db = connection.alias
+        inserted[name] = obj
+
+    return inserted
+
+
+def resolve_by_name(model, user, names):
+    # return a {name: object} mapping of the user's tags or ingredients,
+    # creating the missing ones, in one SELECT and one upsert
+    names = set(names)
+    if not names:
+        return {}
+
+    resolved = {
+        obj.name: obj
+        for obj in model.objects.filter(user=user, name__in=names)
+    }
+    # sorted, so concurrent upserts of overlapping names lock the unique
+    # index entries in the same order
+    missing = sorted(names - set(resolved))
+    if missing:
+        resolved.update(insert_names(model, user, missing))
+
+    # names skipped by the upsert were committed by a concurrent request
+    # after our SELECT, read them back
+    raced = [name for name in missing if name not in resolved]
+    if raced:
+        for obj in model.objects.filter(user=user, name__in=raced):
+            resolved[obj.name] = obj
+
+    return resolved
+
+
+def bulk_create_recipes(user, items):
+    # create recipes from a list of validated payloads, resolving every
+    # tag and ingredient they reference with one query per model
+    recipes = []
+    tag_names = []
+    ingredient_names = []
+    for item in items:
+        data = dict(item)
+        data.pop("image", None)
+        tag_names.append({tag["name"] for tag in data.pop("tags", [])})
+        ingredient_names.append(
+            {ingredient["name"] for ingredient in data.pop("ingredients", [])}
+        )
+        recipes.append(Recipe(user=user, **data))
+
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(recipes)
+        tags = resolve_by_name(Tag, user, set().union(*tag_names))
+        ingredients = resolve_by_name(
+            Ingredient,
+            user,
+            set().union(*ingredient_names),
+        )
+
+        Recipe.tags.through.objects.bulk_create(
+            [
+                Recipe.tags.through(recipe_id=recipe.id, tag_id=tags[name].id)
+                for recipe, names in zip(recipes, tag_names)
+                for name in names
+            ]
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            [
+                Recipe.ingredients.through(
+                    recipe_id=recipe.id,
+                    ingredient_id=ingredients[name].id,
+                )
+                for recipe, names in zip(recipes, ingredient_names)
+                for name in names
+            ]
+        )
+        # bulk_create sends no signals, invalidate cached responses here
+        bump_user_version(user.id)
+
+    prefetch_related_objects(recipes, "tags", "ingredients")
+    return recipes
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    # Base serializer for tags and ingredients
+    # only present when the queryset was annotated with it
+    recipe_count = serializers.IntegerField(read_only=True)
 
+    def validate_name(self, value):
+        # names are unique per user, nested recipe payloads reuse them
+        if self.root is not self:
+            return value
 
-class TagSerializer(serializers.ModelSerializer):
+        others = self.Meta.model.objects.filter(
+            user=self.context["request"].user,
+            name=value,
+        )
+        if self.instance is not None:
+            others = others.exclude(pk=self.instance.pk)
+        if others.exists():
+            raise serializers.ValidationError(
+                f"You already have a {self.Meta.model._meta.verbose_name} "
+                "with this name."
+            )
+
+        return value
+
+
+class TagSerializer(RecipeAttrSerializer):
     # Serializer for tags
     class Meta:
         model = Tag
-        fields = ["id", "name"]
+        fields = ["id", "name", "recipe_count"]
         read_only_fields = ["id"]
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     # Serializer for tags
     class Meta:
         model = Ingredient
-        fields = ["id", "name"]
+        fields = ["id", "name", "recipe_count"]
         read_only_fields = ["id"]
 
 
@@ -41,25 +173,21 @@ class RecipeSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id"]
 
-    def _get_or_create_tags(self, tags, recipe):
-        # handle getting or creating tags as needed
+    def _get_or_create_tags(self, tags):
+        # handle getting or creating tags as needed, in bulk
         auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+        tag_objs = resolve_by_name(Tag, auth_user, [t["name"] for t in tags])
+        return list(tag_objs.values())
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        # handle getting or creating ingredients as needed
+    def _get_or_create_ingredients(self, ingredients):
+        # handle getting or creating ingredients as needed, in bulk
         auth_user = self.context["request"].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = resolve_by_name(
+            Ingredient,
+            auth_user,
+            [ingredient["name"] for ingredient in ingredients],
+        )
+        return list(ingredient_objs.values())
 
     def create(self, validated_data):
         # create a recipe
@@ -68,8 +196,8 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         recipe = Recipe.objects.create(**validated_data)
 
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
 
         return recipe
 
@@ -78,13 +206,14 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)
 
+        # set() only deletes and inserts the through rows that changed
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_ingredients(ingredients),
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -93,17 +222,67 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RecipeImageVariantSerializer(serializers.Serializer):
+    # Serializer for a resized copy of a recipe image
+    format = serializers.ChoiceField(choices=["webp", "jpeg"])
+    width = serializers.IntegerField()
+    height = serializers.IntegerField()
+    url = serializers.URLField()
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     #  Serializer for recipe details
+    image_variants = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"]
+        fields = RecipeSerializer.Meta.fields + [
+            "description",
+            "image",
+            "image_variants",
+        ]
+        # images are only written by the upload action, which bounds and
+        # validates them and looks after their variants and stored files
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + ["image"]
+
+    @extend_schema_field(RecipeImageVariantSerializer(many=True))
+    def get_image_variants(self, recipe):
+        # list the variants rendered so far, with URLs like the image's
+        storage = recipe.image.storage
+        request = self.context.get("request")
+        variants = []
+        for variant in recipe.image_variants:
+            url = storage.url(variant["name"])
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants.append(
+                {
+                    "format": variant["format"],
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "url": url,
+                }
+            )
+
+        return variants
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     #  Serializer for uploading images to recipes
+    image = BoundedImageField()
 
     class Meta:
         model = Recipe
         fields = ["id", "image"]
         read_only_fields = ["id"]
-        extra_kwargs = {"image": {"required": "True"}}
+
+
+class RecipeBulkCreateErrorSerializer(serializers.Serializer):
+    #  Serializer for the errors of one item of a bulk create
+    index = serializers.IntegerField()
+    errors = serializers.DictField()
+
+
+class RecipeBulkCreateResultSerializer(serializers.Serializer):
+    #  Serializer for the outcome of a bulk create
+    created = RecipeDetailSerializer(many=True)
+    errors = RecipeBulkCreateErrorSerializer(many=True)
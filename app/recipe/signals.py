@@ -0,0 +1,44 @@
+"""
+  Signal handlers keeping recipe response caches and image files in sync
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag
+from recipe import images
+from recipe.cache import bump_user_version
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_on_write(sender, instance, **kwargs):
+    # a recipe, tag or ingredient was written
+    bump_user_version(instance.user_id)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_on_user_created(sender, instance, created, **kwargs):
+    # the shared cache outlives the database, a new user must not find
+    # responses cached for an earlier user with the same ID
+    if created:
+        bump_user_version(instance.id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_on_m2m_change(sender, instance, action, **kwargs):
+    # tags or ingredients were linked to or unlinked from a recipe
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_user_version(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image_files(sender, instance, **kwargs):
+    # a deleted recipe no longer refers to its image files
+    images.release_on_commit(images.file_names(instance))
@@ -0,0 +1,279 @@
+"""
+  Tests for recipe response caching and conditional GET
+"""
+
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+from recipe.cache import bump_user_version, get_user_version
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+
+
+def create_recipe(user, **params):
+    # create and return a sample recipe
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 10,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(params)
+
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(email="test@example.com", password="pass123"):
+    # create and return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class RecipeCacheTests(TestCase):
+    """Test caching of recipe list responses"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertCached(self, url, params=None):
+        # check that the response is served without touching the database
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        return res
+
+    def test_recipe_list_cached(self):
+        # test a repeated recipe list is served from the cache
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+
+        cached = self.assertCached(RECIPE_URL)
+
+        self.assertEqual(cached.data, res.data)
+
+    def test_filter_params_normalized(self):
+        # test equivalent filters share one cache entry
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Thai")
+        self.client.get(RECIPE_URL, {"tags": f"{tag1.id},{tag2.id}"})
+
+        self.assertCached(RECIPE_URL, {"tags": f"{tag2.id}, {tag1.id}"})
+
+    def test_create_recipe_invalidates(self):
+        # test creating a recipe makes the cached list stale
+        self.client.get(RECIPE_URL)
+        payload = {"title": "New", "time_minutes": 5, "price": "1.00"}
+        self.client.post(RECIPE_URL, payload)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_bulk_create_invalidates(self):
+        # test bulk creating recipes makes the cached list stale
+        self.client.get(RECIPE_URL)
+        payload = [{"title": "New", "time_minutes": 5, "price": "1.00"}]
+        self.client.post(
+            reverse("recipe:recipe-bulk-create"),
+            payload,
+            format="json",
+        )
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_tag_update_invalidates(self):
+        # test renaming a tag makes the cached lists stale
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+        self.client.get(RECIPE_URL)
+        self.client.get(TAGS_URL)
+
+        tag.name = "Vegetarian"
+        tag.save()
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(res.data["results"][0]["tags"][0]["name"], tag.name)
+        res = self.client.get(TAGS_URL)
+        self.assertEqual(res.data[0]["name"], tag.name)
+
+    def test_m2m_change_invalidates(self):
+        # test linking an ingredient makes assigned_only lists stale
+        ingredient = Ingredient.objects.create(user=self.user, name="Salt")
+        recipe = create_recipe(user=self.user)
+        res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
+        self.assertEqual(res.data, [])
+
+        recipe.ingredients.add(ingredient)
+
+        res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
+        self.assertEqual(len(res.data), 1)
+
+    def test_delete_recipe_invalidates(self):
+        # test deleting a recipe bumps the user's version
+        recipe = create_recipe(user=self.user)
+        version = get_user_version(self.user.id)
+
+        recipe.delete()
+
+        self.assertNotEqual(get_user_version(self.user.id), version)
+
+    def test_cache_limited_to_user(self):
+        # test users don't share cached responses
+        create_recipe(user=self.user)
+        self.client.get(RECIPE_URL)
+        user2 = create_user(email="test2@example.com")
+        self.client.force_authenticate(user=user2)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data["results"], [])
+
+    def test_other_user_write_keeps_cache(self):
+        # test another user's writes don't invalidate the cache
+        self.client.get(RECIPE_URL)
+        create_recipe(user=create_user(email="test2@example.com"))
+
+        self.assertCached(RECIPE_URL)
+
+    def test_bumped_version_does_not_expire(self):
+        # test a bumped version outlives the cache's default timeout
+        get_user_version(self.user.id)
+        bump_user_version(self.user.id)
+        version = get_user_version(self.user.id)
+
+        later = time.time() + cache.default_timeout + 1
+        with mock.patch("time.time", return_value=later):
+            self.assertEqual(get_user_version(self.user.id), version)
+
+    def test_new_user_not_served_reused_id_cache(self):
+        # test a user reusing the ID of one the database no longer has,
+        # as after a restore, starts from a new version
+        user_id = self.user.id + 1000
+        version = get_user_version(user_id)
+
+        get_user_model().objects.create_user(
+            id=user_id,
+            email="test2@example.com",
+            password="pass123",
+        )
+
+        self.assertNotEqual(get_user_version(user_id), version)
+
+
+class ConditionalGetTests(TestCase):
+    """Test ETags and conditional GET on the recipe APIs"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertNotModified(self, url, etag):
+        # check the url answers 304 without running any query
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_recipe_list_not_modified(self):
+        # test the recipe list answers 304 for a current ETag
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotModified(RECIPE_URL, res["ETag"])
+
+    def test_recipe_detail_not_modified(self):
+        # test recipe details answer 304 for a current ETag
+        recipe = create_recipe(user=self.user)
+        url = reverse("recipe:recipe-detail", args=[recipe.id])
+        res = self.client.get(url)
+
+        self.assertNotModified(url, res["ETag"])
+
+    def test_tag_and_ingredient_lists_not_modified(self):
+        # test tag and ingredient lists answer 304 for a current ETag
+        Tag.objects.create(user=self.user, name="Vegan")
+        Ingredient.objects.create(user=self.user, name="Salt")
+
+        for url in (TAGS_URL, INGREDIENTS_URL):
+            res = self.client.get(url)
+            self.assertNotModified(url, res["ETag"])
+
+    def test_etag_changes_after_write(self):
+        # test a write makes previous ETags stale
+        recipe = create_recipe(user=self.user)
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        recipe.title = "New title"
+        recipe.save()
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(res.data["results"][0]["title"], "New title")
+
+    def test_etag_depends_on_query(self):
+        # test different query params get different ETags
+        res1 = self.client.get(RECIPE_URL)
+        res2 = self.client.get(RECIPE_URL, {"page_size": 1})
+
+        self.assertNotEqual(res1["ETag"], res2["ETag"])
+
+    def test_weak_etag_matches(self):
+        # test a weak validator sent back by a proxy still matches
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=f"W/{etag}")
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_wildcard_needs_existing_recipe(self):
+        # test If-None-Match: * answers 304 only for a recipe the user has
+        recipe = create_recipe(user=self.user)
+        other = create_recipe(user=create_user(email="test2@example.com"))
+
+        for recipe_id, expected in [
+            (recipe.id, status.HTTP_304_NOT_MODIFIED),
+            (other.id, status.HTTP_404_NOT_FOUND),
+            (999999999, status.HTTP_404_NOT_FOUND),
+        ]:
+            with self.subTest(recipe_id=recipe_id):
+                res = self.client.get(
+                    reverse("recipe:recipe-detail", args=[recipe_id]),
+                    HTTP_IF_NONE_MATCH="*",
+                )
+                self.assertEqual(res.status_code, expected)
+
+    def test_etag_limited_to_user(self):
+        # test another user's ETag doesn't match
+        etag = self.client.get(RECIPE_URL)["ETag"]
+        self.client.force_authenticate(user=create_user("test2@example.com"))
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
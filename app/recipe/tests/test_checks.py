@@ -0,0 +1,31 @@
+"""
+  Tests for the recipe system checks
+"""
+
+from django.test import SimpleTestCase, override_settings
+
+from recipe.checks import check_shared_recipe_cache
+
+LOCMEM = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    # test the cache behind response versions is shared with job workers
+    @override_settings(RECIPE_IMAGE_JOBS=True, CACHES=LOCMEM)
+    def test_process_local_cache_with_jobs(self):
+        # test a process-local cache is refused with image jobs
+        errors = check_shared_recipe_cache(None)
+
+        self.assertEqual([error.id for error in errors], ["recipe.E001"])
+
+    @override_settings(RECIPE_IMAGE_JOBS=False, CACHES=LOCMEM)
+    def test_process_local_cache_without_jobs(self):
+        # test a process-local cache is fine without image jobs
+        self.assertEqual(check_shared_recipe_cache(None), [])
+
+    @override_settings(RECIPE_IMAGE_JOBS=True)
+    def test_shared_cache_with_jobs(self):
+        # test the default file cache is fine with image jobs
+        self.assertEqual(check_shared_recipe_cache(None), [])
@@ -0,0 +1,263 @@
+"""
+  Tests for the recipe image variants
+"""
+
+from decimal import Decimal
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from core import constants, jobs
+from core.models import Recipe
+
+from recipe import images
+
+# EXIF tag holding the orientation, and the value for "rotate 90 CW"
+ORIENTATION = 0x0112
+ROTATE_90 = 6
+
+
+def encode_image(size, mode="RGB", image_format="JPEG", **options):
+    # return the bytes of a new, half transparent if possible, image
+    image = Image.new(mode, size, "red")
+    if "A" in mode:
+        image.putalpha(128)
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **options)
+    return buffer.getvalue()
+
+
+def create_recipe(user, **params):
+    # create and return a sample recipe
+    return Recipe.objects.create(
+        user=user,
+        title="Sample recipe",
+        price=Decimal("5.00"),
+        **params,
+    )
+
+
+class RenderVariantsTests(SimpleTestCase):
+    # test rendering the variants of an image
+    def test_widths_and_formats(self):
+        # test every width/format is rendered, never wider than the original
+        data = encode_image((800, 400))
+
+        variants = images.render_variants(data, [1280, 320, 640], ["webp"])
+
+        self.assertEqual(
+            [v[:3] for v in variants],
+            [("webp", 320, 160), ("webp", 640, 320), ("webp", 800, 400)],
+        )
+        with Image.open(io.BytesIO(variants[0][3])) as variant:
+            self.assertEqual(variant.format, "WEBP")
+            self.assertEqual(variant.size, (320, 160))
+
+    def test_exif_stripped_and_orientation_applied(self):
+        # test variants are upright and carry no EXIF metadata
+        exif = Image.Exif()
+        exif[ORIENTATION] = ROTATE_90
+        data = encode_image((400, 200), exif=exif.tobytes())
+
+        variants = images.render_variants(data, [100], ["jpeg", "webp"])
+
+        self.assertEqual([v[1:3] for v in variants], [(100, 200)] * 2)
+        for variant in variants:
+            with Image.open(io.BytesIO(variant[3])) as image:
+                self.assertEqual(len(image.getexif()), 0)
+                self.assertNotIn("exif", image.info)
+
+    def test_transparent_image_to_jpeg(self):
+        # test images with alpha are flattened for JPEG
+        data = encode_image((50, 50), mode="RGBA", image_format="PNG")
+
+        variants = images.render_variants(data, [50], ["jpeg", "webp"])
+
+        with Image.open(io.BytesIO(variants[0][3])) as jpeg:
+            self.assertEqual(jpeg.mode, "RGB")
+        with Image.open(io.BytesIO(variants[1][3])) as webp:
+            self.assertEqual(webp.mode, "RGBA")
+
+
+class MediaRootMixin:
+    """Store uploaded files in a temporary media root"""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.user = get_user_model().objects.create_user(
+            email="image@example.com",
+            password="pass123",
+        )
+
+
+@override_settings(
+    RECIPE_IMAGE_VARIANTS_EAGER=True,
+    RECIPE_IMAGE_VARIANT_WIDTHS=[320, 640],
+)
+class ImageVariantApiTests(MediaRootMixin, TestCase):
+    # test variants rendered on upload
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def upload(self, size):
+        # upload a JPEG image of size to the recipe
+        url = reverse("recipe:recipe-upload-image", args=[self.recipe.id])
+        image_file = io.BytesIO(encode_image(size))
+        image_file.name = "photo.jpg"
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                url,
+                {"image": image_file},
+                format="multipart",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+
+    def test_variants_exposed(self):
+        # test the rendered variants are listed on the recipe detail
+        self.upload((1000, 500))
+
+        res = self.client.get(
+            reverse("recipe:recipe-detail", args=[self.recipe.id]),
+        )
+
+        variants = res.data["image_variants"]
+        self.assertEqual(
+            [(v["format"], v["width"], v["height"]) for v in variants],
+            [
+                ("webp", 320, 160),
+                ("jpeg", 320, 160),
+                ("webp", 640, 320),
+                ("jpeg", 640, 320),
+            ],
+        )
+        self.assertTrue(variants[0]["url"].startswith("http://testserver/"))
+        for variant in self.recipe.image_variants:
+            self.assertTrue(self.recipe.image.storage.exists(variant["name"]))
+
+    def test_new_upload_replaces_variants(self):
+        # test uploading a new image replaces the variants of the old one
+        self.upload((1000, 500))
+        old_names = {v["name"] for v in self.recipe.image_variants}
+
+        self.upload((200, 200))
+
+        self.assertEqual(
+            [(v["width"], v["height"]) for v in self.recipe.image_variants],
+            [(200, 200), (200, 200)],
+        )
+        new_names = {v["name"] for v in self.recipe.image_variants}
+        self.assertFalse(old_names & new_names)
+
+    def test_unsupported_format_skipped(self):
+        # test formats Pillow was built without are left out
+        with mock.patch.object(
+            images.features,
+            "check",
+            side_effect=lambda feature: feature != "webp",
+        ), self.assertLogs("recipe.images", "WARNING"):
+            self.upload((1000, 500))
+
+        self.assertEqual(
+            [v["format"] for v in self.recipe.image_variants],
+            ["jpeg", "jpeg"],
+        )
+
+    def test_stale_variants_discarded(self):
+        # test variants of a replaced image are not recorded or kept
+        self.upload((400, 400))
+        data = encode_image((64, 64))
+        rendered = images.render_variants(data, [64], ["webp"])
+
+        stored = images.store_variants(self.recipe.id, "old.jpg", rendered)
+
+        self.assertEqual(stored, [])
+        self.recipe.refresh_from_db()
+        self.assertEqual(len(self.recipe.image_variants), 4)
+        storage = self.recipe.image.storage
+        self.assertFalse(storage.exists("old-64w.webp"))
+
+
+@override_settings(
+    RECIPE_IMAGE_JOBS=True,
+    RECIPE_IMAGE_VARIANT_WIDTHS=[100],
+)
+class ImageJobTests(MediaRootMixin, TestCase):
+    # test image work handed to the job queue
+    def test_variants_and_release_queued(self):
+        # test variants are rendered, and files released, by jobs
+        recipe = create_recipe(user=self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        image_file = io.BytesIO(encode_image((300, 150)))
+        image_file.name = "photo.jpg"
+        client.post(
+            reverse("recipe:recipe-upload-image", args=[recipe.id]),
+            {"image": image_file},
+            format="multipart",
+        )
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, [])
+        self.assertEqual(jobs.run_job(jobs.claim_job()), constants.JOB_DONE)
+        recipe.refresh_from_db()
+        self.assertEqual(len(recipe.image_variants), 2)
+
+        names = images.file_names(recipe)
+        recipe.delete()
+        storage = recipe.image.storage
+        self.assertTrue(all(storage.exists(name) for name in names))
+        job = jobs.claim_job()
+        self.assertEqual(job.payload, {"names": names})
+        jobs.run_job(job)
+        self.assertFalse(any(storage.exists(name) for name in names))
+
+
+@override_settings(RECIPE_IMAGE_VARIANT_WIDTHS=[100])
+class ImageVariantPoolTests(MediaRootMixin, TransactionTestCase):
+    # test variants rendered in the process pool
+    def test_render_in_pool(self):
+        # test the pool renders and records the variants
+        recipe = create_recipe(user=self.user)
+        storage = recipe.image.storage
+        data = io.BytesIO(encode_image((300, 150)))
+        recipe.image = storage.save("photo.jpg", data)
+        recipe.save()
+
+        future = images.submit_variants(recipe.id, recipe.image.name)
+        variants = future.result(timeout=60)
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, variants)
+        self.assertEqual(
+            [(v["format"], v["width"], v["height"]) for v in variants],
+            [("webp", 100, 50), ("jpeg", 100, 50)],
+        )
+        for variant in variants:
+            path = storage.path(variant["name"])
+            self.assertTrue(os.path.exists(path))
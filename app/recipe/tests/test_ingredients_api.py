@@ -4,8 +4,10 @@
 
 from decimal import Decimal
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -14,6 +16,7 @@ from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse("recipe:ingredient-list")
+AUTOCOMPLETE_URL = reverse("recipe:ingredient-autocomplete")
 
 
 def detail_url(ingredient_id):
@@ -134,3 +137,173 @@ class PrivateApiIngredientsTests(TestCase):
         res = self.client.get(INGREDIENTS_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_filter_ingredients_min_usage(self):
+        """Test filtering ingredients used by at least min_usage recipes"""
+        eggs = Ingredient.objects.create(user=self.user, name="Eggs")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        Ingredient.objects.create(user=self.user, name="Saffron")
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title=f"Recipe {i}",
+                price=Decimal("1.00"),
+                user=self.user,
+            )
+            recipe.ingredients.add(eggs)
+            if i == 0:
+                recipe.ingredients.add(salt)
+
+        res = self.client.get(INGREDIENTS_URL, {"min_usage": 2})
+        self.assertEqual([i["name"] for i in res.data], ["Eggs"])
+
+        res = self.client.get(INGREDIENTS_URL, {"min_usage": 1})
+        self.assertEqual([i["name"] for i in res.data], ["Salt", "Eggs"])
+
+    def test_filter_ingredients_invalid_min_usage(self):
+        """Test a non numeric min_usage is rejected"""
+        res = self.client.get(INGREDIENTS_URL, {"min_usage": "lots"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_ingredients_invalid_flags(self):
+        # test flags that aren't integers are rejected
+        for param in ["assigned_only", "with_recipe_count"]:
+            with self.subTest(param=param):
+                res = self.client.get(INGREDIENTS_URL, {param: "yes"})
+                self.assertEqual(
+                    res.status_code,
+                    status.HTTP_400_BAD_REQUEST,
+                )
+
+    def test_list_ingredients_with_recipe_count(self):
+        """Test recipe counts are returned on request in one query"""
+        eggs = Ingredient.objects.create(user=self.user, name="Eggs")
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+        Ingredient.objects.create(user=self.user, name="Saffron")
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title=f"Recipe {i}",
+                price=Decimal("1.00"),
+                user=self.user,
+            )
+            recipe.ingredients.add(eggs)
+            if i == 0:
+                recipe.ingredients.add(salt)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(INGREDIENTS_URL, {"with_recipe_count": 1})
+
+        self.assertEqual(
+            [(i["name"], i["recipe_count"]) for i in res.data],
+            [("Salt", 1), ("Saffron", 0), ("Eggs", 3)],
+        )
+
+        res = self.client.get(INGREDIENTS_URL)
+        self.assertNotIn("recipe_count", res.data[0])
+
+    def test_order_ingredients_by_recipe_count(self):
+        """Test ordering ingredients by usage, ties by name"""
+        names = ["Eggs", "Salt", "Pepper", "Oil"]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in names
+        ]
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                title=f"Recipe {i}",
+                price=Decimal("1.00"),
+                user=self.user,
+            )
+            recipe.ingredients.add(*ingredients[: 3 - i])
+
+        res = self.client.get(INGREDIENTS_URL, {"ordering": "-recipe_count"})
+        self.assertEqual(
+            [i["name"] for i in res.data],
+            ["Eggs", "Salt", "Pepper", "Oil"],
+        )
+        self.assertNotIn("recipe_count", res.data[0])
+
+        res = self.client.get(INGREDIENTS_URL, {"ordering": "recipe_count"})
+        self.assertEqual(
+            [i["name"] for i in res.data],
+            ["Oil", "Pepper", "Salt", "Eggs"],
+        )
+
+    def test_invalid_ordering(self):
+        """Test ordering by an unknown field is rejected"""
+        res = self.client.get(INGREDIENTS_URL, {"ordering": "user"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_ingredients(self):
+        """Test autocomplete returns the user's prefix matches"""
+        for name in ["Salt", "salmon", "Sage", "Rock salt", "SAL"]:
+            Ingredient.objects.create(user=self.user, name=name)
+        other_user = create_user(email="other@example.com")
+        Ingredient.objects.create(user=other_user, name="Salami")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "sal"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [i["name"] for i in res.data],
+            ["SAL", "salmon", "Salt"],
+        )
+
+    def test_autocomplete_limit(self):
+        """Test autocomplete returns at most limit suggestions"""
+        for i in range(60):
+            Ingredient.objects.create(user=self.user, name=f"Pepper {i:02}")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "pep", "limit": 3})
+        self.assertEqual(
+            [i["name"] for i in res.data],
+            ["Pepper 00", "Pepper 01", "Pepper 02"],
+        )
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "pep"})
+        self.assertEqual(len(res.data), 10)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "pep", "limit": 500})
+        self.assertEqual(len(res.data), 50)
+
+    def test_autocomplete_escapes_wildcards(self):
+        """Test LIKE wildcards in the prefix are matched literally"""
+        Ingredient.objects.create(user=self.user, name="100% cocoa")
+        Ingredient.objects.create(user=self.user, name="1000 island")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "100%"})
+
+        self.assertEqual([i["name"] for i in res.data], ["100% cocoa"])
+
+    def test_autocomplete_empty_prefix(self):
+        """Test autocomplete without a prefix suggests nothing"""
+        Ingredient.objects.create(user=self.user, name="Salt")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": " "})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_autocomplete_invalid_limit(self):
+        """Test a non numeric limit is rejected"""
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "s", "limit": "many"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_uses_prefix_index(self):
+        """Test the autocomplete query is an index range scan"""
+        Ingredient.objects.create(user=self.user, name="Salt")
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(AUTOCOMPLETE_URL, {"q": "sal"})
+
+        with connection.cursor() as cursor:
+            # too few rows for the planner to prefer the index on its own
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("EXPLAIN " + ctx.captured_queries[0]["sql"])
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        self.assertIn("ingredient_name_prefix_idx", plan)
+        # rows come out of the index in order, at most ties on the name
+        # are sorted again
+        self.assertNotIn("->  Sort", plan)
@@ -0,0 +1,218 @@
+"""
+  Tests for serving recipe media
+"""
+
+import os
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from recipe import media
+from recipe.tests.test_images import MediaRootMixin
+
+CONTENT = b"0123456789"
+
+
+def media_url(name):
+    # return the URL serving a stored file
+    return reverse("media", args=[name])
+
+
+class ParseRangeTests(SimpleTestCase):
+    # test parsing Range headers against a 10 byte file
+    def test_parse_range(self):
+        # test single ranges are clamped and other forms ignored
+        cases = [
+            ("bytes=2-5", (2, 5)),
+            ("bytes=2-", (2, 9)),
+            ("bytes=-3", (7, 9)),
+            ("bytes=-30", (0, 9)),
+            ("bytes=8-30", (8, 9)),
+            ("bytes=5-2", None),
+            ("bytes=0-1,4-5", None),
+            ("bytes=-", None),
+            ("items=0-1", None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header):
+                self.assertEqual(media.parse_range(header, 10), expected)
+
+    def test_unsatisfiable(self):
+        # test ranges past the end of the file are unsatisfiable
+        for header in ["bytes=10-", "bytes=-0"]:
+            with self.subTest(header=header):
+                with self.assertRaises(media.UnsatisfiableRange):
+                    media.parse_range(header, 10)
+
+
+class RecipeMediaTests(MediaRootMixin, TestCase):
+    # test the media view
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        storage = Recipe._meta.get_field("image").storage
+        self.name = storage.save("uploads/recipe/a.jpg", ContentFile(CONTENT))
+        self.variant = storage.save(
+            "uploads/recipe/a-1w.webp",
+            ContentFile(b"variant"),
+        )
+        self.path = storage.path(self.name)
+        Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            price=Decimal("5.00"),
+            image=self.name,
+            image_variants=[{"format": "webp", "name": self.variant}],
+        )
+
+    def get(self, name=None, **headers):
+        # request a file, reading (and closing) streamed content into body
+        res = self.client.get(media_url(name or self.name), **headers)
+        if res.streaming:
+            res.body = b"".join(res.streaming_content)
+        else:
+            res.body = res.content
+        return res
+
+    def test_owner_gets_file(self):
+        # test the owner gets the file with immutable cache headers
+        res = self.get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.body, CONTENT)
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        self.assertEqual(res["Accept-Ranges"], "bytes")
+        self.assertEqual(
+            res["Last-Modified"],
+            http_date(os.path.getmtime(self.path)),
+        )
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertIn("private", res["Cache-Control"])
+
+    def test_variant(self):
+        # test variants are served too
+        res = self.get(self.variant)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "image/webp")
+
+    def test_variant_type_without_system_table(self):
+        # test variants get their type where mimetypes doesn't know webp,
+        # as on Python 3.9 without a system mime.types
+        with mock.patch.object(
+            media.mimetypes,
+            "guess_type",
+            return_value=(None, None),
+        ):
+            res = self.get(self.variant)
+
+        self.assertEqual(res["Content-Type"], "image/webp")
+
+    def test_other_users_denied(self):
+        # test other users, or anonymous ones, don't get the file
+        other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="pass123",
+        )
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.get().status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(
+            self.get().status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_unknown_files(self):
+        # test files no recipe refers to, and missing files, aren't found
+        storage = Recipe._meta.get_field("image").storage
+        stray = storage.save("uploads/recipe/b.jpg", ContentFile(b"stray"))
+        self.assertEqual(self.get(stray).status_code, 404)
+
+        os.remove(self.path)
+        self.assertEqual(self.get().status_code, 404)
+
+    def test_range(self):
+        # test a byte range gets a partial response
+        res = self.get(HTTP_RANGE="bytes=2-5")
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(res.body, b"2345")
+        self.assertEqual(res["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(res["Content-Length"], "4")
+
+    def test_range_unsatisfiable(self):
+        # test a range past the end of the file gets a 416
+        res = self.get(HTTP_RANGE="bytes=10-")
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+        self.assertEqual(res["Content-Range"], "bytes */10")
+
+    def test_if_range(self):
+        # test ranges only apply to the version named by If-Range
+        last_modified = http_date(os.path.getmtime(self.path))
+
+        res = self.get(HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE=last_modified)
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+        res = self.get(HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE="other")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_if_modified_since(self):
+        # test unchanged files get a 304
+        mtime = os.path.getmtime(self.path)
+
+        res = self.get(HTTP_IF_MODIFIED_SINCE=http_date(mtime))
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn("immutable", res["Cache-Control"])
+
+        res = self.get(HTTP_IF_MODIFIED_SINCE=http_date(mtime - 60))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(RECIPE_IMAGE_CONTENT_ADDRESSED=False)
+    def test_reusable_name_revalidated(self):
+        # test files whose name isn't their content aren't cached as is
+        storage = Recipe._meta.get_field("image").storage
+        name = storage.save("uploads/recipe/c.jpg", ContentFile(b"c"))
+        Recipe.objects.update(image=name)
+
+        res = self.get(name)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("no-cache", res["Cache-Control"])
+        self.assertNotIn("immutable", res["Cache-Control"])
+
+    @override_settings(
+        MEDIA_SENDFILE="x-accel-redirect",
+        MEDIA_ACCEL_PREFIX="/protected/",
+    )
+    def test_x_accel_redirect(self):
+        # test nginx is told to send the file
+        res = self.get()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["X-Accel-Redirect"], f"/protected/{self.name}")
+        self.assertEqual(res.body, b"")
+        self.assertIn("immutable", res["Cache-Control"])
+
+    @override_settings(MEDIA_SENDFILE="x-sendfile")
+    def test_x_sendfile(self):
+        # test the proxy is given the file path
+        res = self.get()
+
+        self.assertEqual(res["X-Sendfile"], self.path)
+        self.assertEqual(res.body, b"")
@@ -0,0 +1,142 @@
+"""
+  Tests for the number of queries issued by the recipe APIs
+"""
+
+from decimal import Decimal
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from core.models import Ingredient, Recipe, Tag
+
+RECIPE_URL = reverse("recipe:recipe-list")
+
+
+def detail_url(recipe_id):
+    # return recipe detail URL
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def image_upload_url(recipe_id):
+    # create and return an image upload URL
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+def create_recipe(user, num_tags=0, num_ingredients=0, **params):
+    # create and return a sample recipe with tags and ingredients
+    defaults = {
+        "title": "Sample recipe title",
+        "time_minutes": 10,
+        "price": Decimal("5.25"),
+    }
+    defaults.update(params)
+
+    recipe = Recipe.objects.create(user=user, **defaults)
+    for i in range(num_tags):
+        recipe.tags.add(
+            Tag.objects.create(user=user, name=f"Tag {recipe.id}-{i}")
+        )
+    for i in range(num_ingredients):
+        recipe.ingredients.add(
+            Ingredient.objects.create(
+                user=user,
+                name=f"Ingredient {recipe.id}-{i}",
+            )
+        )
+
+    return recipe
+
+
+class QueryBudgetMixin:
+    """Helpers to pin the number of queries an endpoint may issue"""
+
+    def assertQueryBudget(self, budget, seed, request, sizes=(1, 10)):
+        # for each size, seed data with `seed(size)` and check that
+        # `request(seeded)` issues exactly `budget` queries, however many
+        # rows were seeded
+        for size in sizes:
+            seeded = seed(size)
+            with CaptureQueriesContext(connection) as ctx:
+                res = request(seeded)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                len(ctx.captured_queries),
+                budget,
+                f"{len(ctx.captured_queries)} queries for size {size}, "
+                f"expected {budget}:\n"
+                + "\n".join(q["sql"] for q in ctx.captured_queries),
+            )
+
+
+class RecipeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test the query budget of the recipe endpoints"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="budget@example.com",
+            password="pass123",
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def tearDown(self):
+        for recipe in Recipe.objects.exclude(image=None):
+            recipe.image.delete()
+
+    def test_list_query_budget(self):
+        # test listing recipes costs the same for few and many recipes
+        def seed(size):
+            for _ in range(size):
+                create_recipe(self.user, num_tags=2, num_ingredients=3)
+
+        def request(seeded):
+            return self.client.get(RECIPE_URL)
+
+        self.assertQueryBudget(3, seed, request)
+
+    def test_retrieve_query_budget(self):
+        # test recipe details cost the same for few and many relations
+        def seed(size):
+            return create_recipe(
+                self.user,
+                num_tags=size,
+                num_ingredients=size,
+            )
+
+        def request(recipe):
+            return self.client.get(detail_url(recipe.id))
+
+        self.assertQueryBudget(3, seed, request)
+
+    def test_upload_image_query_budget(self):
+        # test uploading an image doesn't load tags or ingredients
+        def seed(size):
+            return create_recipe(
+                self.user,
+                num_tags=size,
+                num_ingredients=size,
+            )
+
+        def request(recipe):
+            with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+                Image.new("RGB", (10, 10)).save(image_file, format="JPEG")
+                image_file.seek(0)
+                return self.client.post(
+                    image_upload_url(recipe.id),
+                    {"image": image_file},
+                    format="multipart",
+                )
+
+        # the recipe and its update, plus the savepoint and the lock the
+        # image file is written under
+        self.assertQueryBudget(5, seed, request)
@@ -0,0 +1,239 @@
+"""
+  Tests for the query plans of the recipe list filters
+"""
+
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+class QueryPlanMixin:
+    """Helpers to inspect the plan of the query behind a request"""
+
+    def explain(self, sql):
+        # return the text of the plan Postgres picks for sql
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN " + sql)
+            return "\n".join(row[0] for row in cursor.fetchall())
+
+    def get_list_query(self, params, url=RECIPE_URL):
+        # request a list and return the SQL selecting its objects
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, ctx.captured_queries[0]["sql"]
+
+
+class RecipeFilterPlanTests(QueryPlanMixin, TestCase):
+    # test the tag/ingredient filters on a seeded dataset
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="pass123",
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(user=cls.user, name=f"Tag {i}") for i in range(20)
+        )
+        cls.ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=cls.user, name=f"Ingredient {i}")
+            for i in range(20)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(user=cls.user, title=f"Recipe {i}", price=Decimal("1.00"))
+            for i in range(2000)
+        )
+        # every recipe gets 3 consecutive tags and ingredients
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=cls.tags[(i + k) % 20])
+            for i, recipe in enumerate(recipes)
+            for k in range(3)
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(
+                recipe=recipe,
+                ingredient=cls.ingredients[(i + k) % 20],
+            )
+            for i, recipe in enumerate(recipes)
+            for k in range(3)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def expected_ids(self, tags, match):
+        # compute the matching recipe IDs in Python
+        wanted = {tag.id for tag in tags}
+        found = {}
+        for recipe_id, tag_id in Recipe.tags.through.objects.values_list(
+            "recipe_id",
+            "tag_id",
+        ):
+            if tag_id in wanted:
+                found.setdefault(recipe_id, set()).add(tag_id)
+
+        if match == "all":
+            return {rid for rid, ids in found.items() if ids == wanted}
+        return set(found)
+
+    def test_match_any_plan(self):
+        # test match=any is a semi join on the through table, no DISTINCT
+        tags = self.tags[:2]
+        params = {
+            "tags": ",".join(str(tag.id) for tag in tags),
+            "match": "any",
+            "page_size": 100,
+        }
+        res, sql = self.get_list_query(params)
+        plan = self.explain(sql)
+
+        self.assertNotIn("DISTINCT", sql)
+        self.assertIn("Semi Join", plan)
+        self.assertNotIn("Unique", plan)
+        self.assertEqual(len(res.data["results"]), 100)
+        self.assertEqual(len(self.expected_ids(tags, "any")), 400)
+
+    def test_match_all_plan(self):
+        # test match=all is one grouped count over the through table
+        tags = self.tags[:3]
+        params = {
+            "tags": ",".join(str(tag.id) for tag in tags),
+            "match": "all",
+            "page_size": 100,
+        }
+        res, sql = self.get_list_query(params)
+        plan = self.explain(sql)
+
+        self.assertNotIn("DISTINCT", sql)
+        self.assertIn("HAVING COUNT", sql)
+        self.assertIn("Aggregate", plan)
+        self.assertNotIn("Unique", plan)
+        self.assertEqual(len(res.data["results"]), 100)
+        self.assertEqual(
+            {r["id"] for r in res.data["results"]},
+            self.expected_ids(tags, "all"),
+        )
+
+    def test_match_all_no_join_explosion(self):
+        # test the outer query scans recipes once whatever the tag count
+        tags = self.tags[:3]
+        params = {
+            "tags": ",".join(str(tag.id) for tag in tags),
+            "ingredients": f"{self.ingredients[0].id}",
+            "match": "all",
+            "page_size": 100,
+        }
+        res, sql = self.get_list_query(params)
+
+        self.assertEqual(sql.count('JOIN "core_recipe_tags"'), 0)
+        self.assertEqual(sql.count('JOIN "core_recipe_ingredients"'), 0)
+        ids = {r["id"] for r in res.data["results"]}
+        self.assertEqual(ids, self.expected_ids(tags, "all"))
+
+
+class TagUsageFilterPlanTests(QueryPlanMixin, TestCase):
+    # test the assigned_only and min_usage filters on a seeded dataset
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            email="test@example.com",
+            password="pass123",
+        )
+        cls.tags = Tag.objects.bulk_create(
+            Tag(user=cls.user, name=f"Tag {i:02}") for i in range(50)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(user=cls.user, title=f"Recipe {i}", price=Decimal("1.00"))
+            for i in range(1000)
+        )
+        # tag i is used by i * 20 recipes, the last 10 tags by none
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for i, tag in enumerate(cls.tags[:40])
+            for recipe in recipes[: i * 20]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_assigned_only_plan(self):
+        # test assigned_only probes the through table index, no DISTINCT
+        res, sql = self.get_list_query({"assigned_only": 1}, url=TAGS_URL)
+        plan = self.explain(sql)
+
+        self.assertNotIn("DISTINCT", sql)
+        self.assertIn("EXISTS", sql)
+        self.assertIn("Semi Join", plan)
+        self.assertIn("Index Only Scan using core_recipe_tags_tag_", plan)
+        self.assertEqual(len(res.data), 39)
+
+    def test_min_usage_plan(self):
+        # test min_usage counts per tag on the index in the same query
+        res, sql = self.get_list_query({"min_usage": 500}, url=TAGS_URL)
+        plan = self.explain(sql)
+
+        self.assertNotIn("DISTINCT", sql)
+        self.assertNotIn("SubPlan 2", plan)
+        self.assertIn("Index Only Scan using core_recipe_tags_tag_", plan)
+        self.assertEqual(
+            [t["name"] for t in res.data],
+            [f"Tag {i:02}" for i in range(39, 24, -1)],
+        )
+
+    def test_recipe_count_plan(self):
+        # test counts and usage ordering share one subquery on the index
+        params = {"with_recipe_count": 1, "ordering": "-recipe_count"}
+        res, sql = self.get_list_query(params, url=TAGS_URL)
+        plan = self.explain(sql)
+
+        self.assertNotIn("JOIN", sql)
+        self.assertNotIn("SubPlan 2", plan)
+        self.assertIn("Index Only Scan using core_recipe_tags_tag_", plan)
+        self.assertEqual(res.data[0], {
+            "id": self.tags[39].id,
+            "name": "Tag 39",
+            "recipe_count": 780,
+        })
+        self.assertEqual(res.data[-1]["recipe_count"], 0)
+
+
+class ThroughTableIndexTests(TestCase):
+    """Test the indexes kept on the recipe through tables"""
+
+    def test_single_item_index(self):
+        # test the covering item index replaced the FK index on the item
+        items = [("tags", "tag_id"), ("ingredients", "ingredient_id")]
+        for field, column in items:
+            with self.subTest(field=field):
+                table = Recipe._meta.get_field(field).remote_field.through
+                with connection.cursor() as cursor:
+                    constraints = connection.introspection.get_constraints(
+                        cursor,
+                        table._meta.db_table,
+                    )
+
+                leading = [
+                    name
+                    for name, info in constraints.items()
+                    if info["index"] and info["columns"][0] == column
+                ]
+                self.assertEqual(len(leading), 1, leading)
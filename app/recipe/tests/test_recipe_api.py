@@ -3,12 +3,16 @@
 """
 
 from decimal import Decimal
+from unittest.mock import patch
+import json
 import tempfile
 import os
 
 
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -21,6 +25,7 @@ from core.models import Ingredient, Recipe, Tag
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPE_URL = reverse("recipe:recipe-list")
+BULK_URL = reverse("recipe:recipe-bulk-create")
 
 
 def detail_url(recipe_id):
@@ -85,7 +90,7 @@ class PrivateRecipeApiTests(TestCase):
         serializers = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializers.data)
+        self.assertEqual(res.data["results"], serializers.data)
 
     def test_recipes_limited_to_user(self):
         # test retrieving recipes for user
@@ -102,8 +107,8 @@ class PrivateRecipeApiTests(TestCase):
         serializers = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data, serializers.data)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"], serializers.data)
 
     def test_get_recipe_detail(self):
         # test viewing a recipe detail
@@ -292,6 +297,49 @@ class PrivateRecipeApiTests(TestCase):
         self.assertIn(tag_dinner, recipe.tags.all())
         self.assertNotIn(tag_lunch, recipe.tags.all())
 
+    def test_update_recipe_tags_diff(self):
+        # test updating tags only touches the through rows that changed
+        recipe = create_recipe(user=self.user)
+        tag_lunch = Tag.objects.create(user=self.user, name="Lunch")
+        tag_dinner = Tag.objects.create(user=self.user, name="Dinner")
+        recipe.tags.add(tag_lunch, tag_dinner)
+        lunch_link = Recipe.tags.through.objects.get(tag=tag_lunch)
+
+        payload = {"tags": [{"name": "Lunch"}, {"name": "Brunch"}]}
+        url = detail_url(recipe.id)
+        res = self.client.patch(url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list("name", flat=True)),
+            {"Lunch", "Brunch"},
+        )
+        self.assertTrue(
+            Recipe.tags.through.objects.filter(id=lunch_link.id).exists()
+        )
+
+    def test_update_recipe_unchanged_relations(self):
+        # test an unchanged relation set issues no writes
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Lunch"))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name="Salt")
+        )
+
+        payload = {
+            "tags": [{"name": "Lunch"}],
+            "ingredients": [{"name": "Salt"}],
+        }
+        url = detail_url(recipe.id)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for query in ctx.captured_queries:
+            sql = query["sql"]
+            if "core_recipe_tags" in sql or "core_recipe_ingredients" in sql:
+                self.assertTrue(sql.startswith("SELECT"), sql)
+
     def test_clear_recipe_tags(self):
         #  test remove recipe tags
         tag = Tag.objects.create(user=self.user, name="Lunch")
@@ -398,6 +446,48 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_create_recipe_query_count(self):
+        # test creating a recipe costs the same for few and many relations
+        def payload(size):
+            return {
+                "title": "Many relations",
+                "time_minutes": 10,
+                "price": "5.00",
+                "tags": [{"name": f"Tag {i}"} for i in range(size)],
+                "ingredients": [
+                    {"name": f"Ingredient {i}"} for i in range(size)
+                ],
+            }
+
+        counts = []
+        for size in (1, 30):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(
+                    RECIPE_URL,
+                    payload(size),
+                    format="json",
+                )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data["ingredients"]), size)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_create_recipe_duplicate_tag_names(self):
+        # test repeating a tag name in the payload links it once
+        payload = {
+            "title": "Recipe with tags",
+            "tags": [{"name": "Thai"}, {"name": "Thai"}],
+            "time_minutes": 10,
+            "price": Decimal("5.00"),
+        }
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+
     def test_filter_by_tags(self):
         # test filtering recipes by tags
         r1 = create_recipe(user=self.user, title="Thai Soup")
@@ -415,9 +505,9 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"])
 
     def test_filter_by_ingredients(self):
         # test filtering recipes by ingredients
@@ -438,9 +528,344 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data["results"])
+        self.assertIn(s2.data, res.data["results"])
+        self.assertNotIn(s3.data, res.data["results"])
+
+    def test_filter_match_all_tags(self):
+        # test match=all only keeps recipes having every tag
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        r1 = create_recipe(user=self.user, title="Thai Soup")
+        r1.tags.add(tag1, tag2)
+        r2 = create_recipe(user=self.user, title="Porridge")
+        r2.tags.add(tag1)
+        create_recipe(user=self.user, title="Fish and chips")
+
+        params = {"tags": f"{tag1.id},{tag2.id},{tag1.id}", "match": "all"}
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r["id"] for r in res.data["results"]], [r1.id])
+
+    def test_filter_match_all_tags_and_ingredients(self):
+        # test match=all applies to tags and ingredients together
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        in1 = Ingredient.objects.create(user=self.user, name="Tofu")
+        in2 = Ingredient.objects.create(user=self.user, name="Rice")
+        r1 = create_recipe(user=self.user, title="Tofu rice bowl")
+        r1.tags.add(tag)
+        r1.ingredients.add(in1, in2)
+        r2 = create_recipe(user=self.user, title="Tofu scramble")
+        r2.tags.add(tag)
+        r2.ingredients.add(in1)
+
+        params = {
+            "tags": f"{tag.id}",
+            "ingredients": f"{in1.id},{in2.id}",
+            "match": "all",
+        }
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [r1.id])
+
+    def test_filter_match_any_not_duplicated(self):
+        # test recipes matching several IDs are listed once
+        tag1 = Tag.objects.create(user=self.user, name="Vegan")
+        tag2 = Tag.objects.create(user=self.user, name="Dinner")
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+
+        params = {"tags": f"{tag1.id},{tag2.id}", "match": "any"}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual([r["id"] for r in res.data["results"]], [recipe.id])
+        self.assertNotIn("DISTINCT", ctx.captured_queries[0]["sql"])
+
+    def test_filter_invalid_match(self):
+        # test an unknown match mode is rejected
+        res = self.client.get(RECIPE_URL, {"tags": "1", "match": "some"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_paginated(self):
+        # test recipes are returned in cursor paginated pages
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPE_URL, {"page_size": 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", res.data)
+        self.assertIsNone(res.data["previous"])
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [recipes[4].id, recipes[3].id],
+        )
+
+        seen = []
+        next_url = res.data["next"]
+        while next_url:
+            res = self.client.get(next_url)
+            seen.extend(r["id"] for r in res.data["results"])
+            next_url = res.data["next"]
+
+        self.assertEqual(seen, [recipes[2].id, recipes[1].id, recipes[0].id])
+
+    def test_paginate_filtered_recipes(self):
+        # test cursor pagination combined with tag filtering
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        tagged = []
+        for _ in range(3):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+            tagged.append(recipe.id)
+            create_recipe(user=self.user)
+
+        params = {"tags": f"{tag.id}", "page_size": 2}
+        res = self.client.get(RECIPE_URL, params)
+        ids = [r["id"] for r in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        ids += [r["id"] for r in res.data["results"]]
+
+        self.assertEqual(ids, sorted(tagged, reverse=True))
+        self.assertIsNone(res.data["next"])
+
+    def test_paginate_without_count(self):
+        # test paging through recipes never counts the whole set
+        for _ in range(3):
+            create_recipe(user=self.user)
+
+        res = self.client.get(RECIPE_URL, {"page_size": 1})
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(res.data["next"])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        for query in ctx.captured_queries:
+            self.assertNotIn("COUNT(", query["sql"].upper())
+
+    def test_search_recipes(self):
+        # test searching ranks title matches above description matches
+        r1 = create_recipe(
+            user=self.user,
+            title="Weeknight dinner",
+            description="A quick curry with chickpeas",
+        )
+        r2 = create_recipe(
+            user=self.user,
+            title="Chickpea curry",
+            description="Slow cooked",
+        )
+        create_recipe(user=self.user, title="Fish and chips")
+        other_user = create_user(email="other@example.com", password="pass123")
+        create_recipe(user=other_user, title="Chickpea curry")
+
+        res = self.client.get(RECIPE_URL, {"q": "curry chickpeas"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r["id"] for r in res.data["results"]],
+            [r2.id, r1.id],
+        )
+
+    def test_search_vector_updated_on_write(self):
+        # test the search vector follows updates and bulk inserts
+        recipe = create_recipe(user=self.user, title="Thai Soup")
+        Recipe.objects.filter(id=recipe.id).update(title="Lentil stew")
+        payload = [{"title": "Lentil salad", "time_minutes": 5, "price": 1}]
+        self.client.post(BULK_URL, payload, format="json")
+
+        res = self.client.get(RECIPE_URL, {"q": "lentils"})
+        titles = {r["title"] for r in res.data["results"]}
+        self.assertEqual(titles, {"Lentil stew", "Lentil salad"})
+
+        res = self.client.get(RECIPE_URL, {"q": "soup"})
+        self.assertEqual(res.data["results"], [])
+
+    def test_paginate_search_results(self):
+        # test paging through ranked search results with the cursor
+        for i in range(5):
+            create_recipe(
+                user=self.user,
+                title="Curry " * (i % 2 + 1),
+                description="",
+            )
+            create_recipe(user=self.user, title="Fish and chips")
+
+        params = {"q": "curry", "page_size": 2}
+        res = self.client.get(RECIPE_URL, params)
+        ids = [r["id"] for r in res.data["results"]]
+        while res.data["next"]:
+            res = self.client.get(res.data["next"])
+            ids += [r["id"] for r in res.data["results"]]
+
+        # repeated terms rank higher, equal ranks fall back to newest first
+        curries = Recipe.objects.filter(title__startswith="Curry")
+        doubles = curries.filter(title__startswith="Curry Curry")
+        singles = curries.exclude(id__in=doubles)
+        expected = [
+            *doubles.order_by("-id").values_list("id", flat=True),
+            *singles.order_by("-id").values_list("id", flat=True),
+        ]
+        self.assertEqual(ids, expected)
+
+    def test_paginate_search_ties_not_round_tripping(self):
+        # test tied ranks whose float4 value has no short decimal form
+        # don't repeat rows across pages
+        for _ in range(4):
+            create_recipe(user=self.user, title="chicken soup")
+        for _ in range(3):
+            create_recipe(user=self.user, title="chicken chicken soup chicken")
+
+        params = {"q": "chicken", "page_size": 2}
+        res = self.client.get(RECIPE_URL, params)
+        ids = [r["id"] for r in res.data["results"]]
+        for _ in range(10):
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+            ids += [r["id"] for r in res.data["results"]]
+
+        self.assertIsNone(res.data["next"])
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(set(ids)), 7)
+
+    def test_search_uses_gin_index(self):
+        # test the search filters on the indexed vector column
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPE_URL, {"q": "curry"})
+
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertIn('"core_recipe"."search_vector" @@', sql)
+
+    @patch("recipe.views.RecipeViewSet.stream_chunk_size", 2)
+    def test_stream_recipes(self):
+        # test streaming the full recipe list in chunks
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        for _ in range(5):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(tag)
+
+        res = self.client.get(RECIPE_URL, {"stream": 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res["Content-Type"], "application/json")
+        recipes = Recipe.objects.filter(user=self.user).order_by("-id")
+        serializer = RecipeSerializer(recipes, many=True)
+        body = b"".join(res.streaming_content)
+        self.assertEqual(json.loads(body), serializer.data)
+
+    def test_stream_filtered_recipes(self):
+        # test streaming applies the list filters
+        r1 = create_recipe(user=self.user, title="Thai Soup")
+        create_recipe(user=self.user, title="Fish and chips")
+        tag = Tag.objects.create(user=self.user, name="Vegan")
+        r1.tags.add(tag)
+
+        res = self.client.get(RECIPE_URL, {"stream": 1, "tags": tag.id})
+
+        data = json.loads(b"".join(res.streaming_content))
+        self.assertEqual([r["id"] for r in data], [r1.id])
+
+    def test_stream_no_recipes(self):
+        # test streaming an empty recipe list
+        res = self.client.get(RECIPE_URL, {"stream": 1})
+
+        self.assertEqual(b"".join(res.streaming_content), b"[]")
+
+    def test_stream_invalid_flag(self):
+        # test a stream flag that isn't an integer is rejected
+        res = self.client.get(RECIPE_URL, {"stream": "yes"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_recipes(self):
+        # test creating many recipes with tags and ingredients at once
+        existing = Tag.objects.create(user=self.user, name="Thai")
+        payload = [
+            {
+                "title": f"Recipe {i}",
+                "time_minutes": 10,
+                "price": "5.00",
+                "tags": [{"name": "Thai"}, {"name": "Dinner"}],
+                "ingredients": [{"name": "Salt"}, {"name": f"Spice {i}"}],
+            }
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["errors"], [])
+        self.assertEqual(len(res.data["created"]), 3)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user).count(),
+            4,
+        )
+        for recipe in recipes:
+            self.assertIn(existing, recipe.tags.all())
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 2)
+
+    def test_bulk_create_reports_item_errors(self):
+        # test invalid items are reported while valid ones are created
+        payload = [
+            {"title": "Good", "time_minutes": 5, "price": "1.00"},
+            {"title": "Bad", "time_minutes": 5},
+            {"title": "Also good", "time_minutes": 5, "price": "2.00"},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data["created"]), 2)
+        self.assertEqual(len(res.data["errors"]), 1)
+        self.assertEqual(res.data["errors"][0]["index"], 1)
+        self.assertIn("price", res.data["errors"][0]["errors"])
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_create_all_invalid(self):
+        # test a bulk create without valid items creates nothing
+        res = self.client.post(BULK_URL, [{"title": "Bad"}], format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data["created"], [])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_requires_list(self):
+        # test bulk create rejects a single object payload
+        payload = {"title": "Single", "time_minutes": 5, "price": "1.00"}
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_bulk_create_query_count(self):
+        # test bulk create cost doesn't depend on the number of items
+        def payload(size):
+            return [
+                {
+                    "title": f"Recipe {i}",
+                    "time_minutes": 10,
+                    "price": "5.00",
+                    "tags": [{"name": f"Tag {i}"}],
+                    "ingredients": [{"name": f"Ingredient {i}"}],
+                }
+                for i in range(size)
+            ]
+
+        counts = []
+        for size in (1, 10):
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_URL, payload(size), format="json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
 
 
 class ImageUploadTests(TestCase):
@@ -477,3 +902,24 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format="multipart")
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_image_read_only_on_recipe(self):
+        # test images can't be written through the recipe endpoints, only
+        # the bounded upload action
+        url = detail_url(self.recipe.id)
+        for method in [self.client.patch, self.client.put]:
+            with self.subTest(method=method.__name__):
+                with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+                    Image.new("RGB", (10, 10)).save(image_file, format="JPEG")
+                    image_file.seek(0)
+                    payload = {
+                        "title": "Sample recipe",
+                        "price": "5.00",
+                        "image": image_file,
+                    }
+                    res = method(url, payload, format="multipart")
+
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertIsNone(res.data["image"])
+                self.recipe.refresh_from_db()
+                self.assertFalse(self.recipe.image)
@@ -0,0 +1,311 @@
+"""
+  Tests for the on demand resized recipe images
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from core.models import Recipe
+
+from recipe import images, resize
+from recipe.tests.test_images import MediaRootMixin, encode_image
+
+
+def resized_url(recipe_id):
+    # return the URL of a recipe's resized image
+    return reverse("recipe:recipe-resized-image", args=[recipe_id])
+
+
+def create_recipe(user, image_size=None):
+    # create and return a sample recipe, with a JPEG of image_size if set
+    recipe = Recipe.objects.create(
+        user=user,
+        title="Sample recipe",
+        price=Decimal("5.00"),
+    )
+    if image_size:
+        recipe.image.save("photo.jpg", ContentFile(encode_image(image_size)))
+    return recipe
+
+
+class SnapWidthTests(SimpleTestCase):
+    # test snapping requested widths to the allowed ones
+    @override_settings(RECIPE_IMAGE_RESIZE_WIDTHS=[640, 160, 320])
+    def test_snap_width(self):
+        # test widths are rounded up to an allowed one, at most the widest
+        cases = [(1, 160), (160, 160), (161, 320), (5000, 640), (None, 640)]
+        for width, expected in cases:
+            with self.subTest(width=width):
+                self.assertEqual(resize.snap_width(width), expected)
+
+
+class DiskLRUCacheTests(SimpleTestCase):
+    # test the byte budget of the disk cache
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = resize.DiskLRUCache(directory, max_bytes=30)
+
+    def put(self, name, age):
+        # cache 10 bytes as name, last used age seconds ago
+        path = self.cache.put(name, b"0123456789")
+        used = time.time() - age
+        os.utime(path, (used, used))
+
+    def test_least_recently_used_evicted(self):
+        # test going over budget evicts the least recently used files
+        self.put("a", age=30)
+        self.put("b", age=20)
+        self.put("c", age=10)
+        self.assertTrue(self.cache.get("a"))
+
+        self.put("d", age=0)
+
+        self.assertIsNone(self.cache.get("b"))
+        for name in "acd":
+            self.assertTrue(self.cache.get(name))
+
+    def test_oversized_file_kept(self):
+        # test a file over the whole budget is still served once
+        self.put("a", age=10)
+
+        path = self.cache.put("big", b"x" * 40)
+
+        self.assertTrue(os.path.exists(path))
+        self.assertIsNone(self.cache.get("a"))
+
+
+class SingleFlightTests(SimpleTestCase):
+    # test coalescing concurrent calls
+    def test_concurrent_calls_coalesced(self):
+        # test concurrent callers share the first caller's result
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def produce():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return "result"
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(resize.single_flight("k", produce)),
+        )
+        leader.start()
+        started.wait(5)
+        waiters = [
+            threading.Thread(
+                target=lambda: results.append(
+                    resize.single_flight("k", produce),
+                ),
+            )
+            for _ in range(4)
+        ]
+        for waiter in waiters:
+            waiter.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in [leader] + waiters:
+            thread.join(5)
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ["result"] * 5)
+
+    def test_exception_shared_then_retried(self):
+        # test a failure reaches the caller and isn't cached
+        def fail():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            resize.single_flight("k", fail)
+        self.assertEqual(resize.single_flight("k", lambda: 1), 1)
+
+
+@override_settings(
+    RECIPE_IMAGE_VARIANTS_EAGER=True,
+    RECIPE_IMAGE_RESIZE_WIDTHS=[160, 320, 640],
+)
+class ResizedImageApiTests(MediaRootMixin, TestCase):
+    # test the resized image endpoint
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = create_recipe(self.user, image_size=(1000, 500))
+
+    def get(self, recipe_id=None, headers=None, **params):
+        # request a resized image, returning the response and its content
+        res = self.client.get(
+            resized_url(recipe_id or self.recipe.id),
+            params,
+            **(headers or {}),
+        )
+        if res.streaming:
+            return res, b"".join(res.streaming_content)
+        return res, res.content
+
+    def test_resized(self):
+        # test the image is resized to the snapped width
+        res, content = self.get(w=300, fmt="jpeg")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        self.assertIn("no-cache", res["Cache-Control"])
+        self.assertNotIn("immutable", res["Cache-Control"])
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertEqual(image.size, (320, 160))
+
+    def test_revalidated_after_new_upload(self):
+        # test a client's copy is current until the recipe image changes
+        res, _ = self.get(w=300)
+        headers = {"HTTP_IF_NONE_MATCH": res["ETag"]}
+        self.assertEqual(self.get(w=300, headers=headers)[0].status_code, 304)
+
+        self.recipe.image.save("new.jpg", ContentFile(encode_image((90, 60))))
+        res, content = self.get(w=300, headers=headers)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], headers["HTTP_IF_NONE_MATCH"])
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.size, (90, 60))
+
+    def test_evicted_before_sent(self):
+        # test a file evicted between its lookup and sending is rendered
+        # again
+        found = resize.resized_image
+        calls = []
+
+        def evicted(*args):
+            name, path = found(*args)
+            calls.append(path)
+            if len(calls) == 1:
+                os.remove(path)
+            return name, path
+
+        with mock.patch.object(resize, "resized_image", side_effect=evicted):
+            res, content = self.get(w=300, fmt="jpeg")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(calls), 2)
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.size, (320, 160))
+
+    def test_defaults(self):
+        # test webp at the widest allowed width by default
+        res, content = self.get()
+
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertEqual(image.width, 640)
+
+    def test_unsupported_format(self):
+        # test formats Pillow was built without are refused, webp falling
+        # back to jpeg by default
+        with mock.patch.object(
+            images.features,
+            "check",
+            side_effect=lambda feature: feature != "webp",
+        ):
+            res, content = self.get()
+            self.assertEqual(self.get(fmt="webp")[0].status_code, 400)
+
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.format, "JPEG")
+
+    def test_rendered_once(self):
+        # test widths snapping to the same one share one cached render
+        with mock.patch.object(
+            images,
+            "render_resized",
+            wraps=images.render_resized,
+        ) as render:
+            for width in [200, 250, 320]:
+                res, _ = self.get(w=width)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        render.assert_called_once()
+
+    def test_invalid_params(self):
+        # test bad widths and formats are rejected
+        for params in [{"w": 0}, {"w": "wide"}, {"fmt": "gif"}]:
+            with self.subTest(params=params):
+                res, _ = self.get(**params)
+                self.assertEqual(res.status_code, 400)
+
+    def test_not_found(self):
+        # test recipes without image, or of other users, are not found
+        self.assertEqual(
+            self.get(create_recipe(self.user).id)[0].status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+        other = get_user_model().objects.create_user(
+            email="other@example.com",
+            password="pass123",
+        )
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.get()[0].status_code, 404)
+
+
+@override_settings(RECIPE_IMAGE_VARIANTS_EAGER=True)
+class ResizeCoalescingTests(MediaRootMixin, TransactionTestCase):
+    # test concurrent requests for one resized image
+    def test_rendered_once(self):
+        # test threads, each with their own connection, render once
+        recipe = create_recipe(self.user, image_size=(800, 400))
+        render_resized = images.render_resized
+
+        def slow_render(*args):
+            time.sleep(0.2)
+            return render_resized(*args)
+
+        paths = []
+
+        def request():
+            try:
+                paths.append(
+                    resize.resized_image(recipe.image.name, 320, "webp"),
+                )
+            finally:
+                connection.close()
+
+        with mock.patch.object(
+            images,
+            "render_resized",
+            side_effect=slow_render,
+        ) as render:
+            threads = [threading.Thread(target=request) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(10)
+
+        render.assert_called_once()
+        self.assertEqual(len(set(paths)), 1)
+        self.assertEqual(len(paths), 6)
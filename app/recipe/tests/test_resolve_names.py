@@ -0,0 +1,115 @@
+"""
+  Tests for resolving tags and ingredients by name
+"""
+
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from core.models import Ingredient, Tag
+
+from recipe import serializers
+
+
+def create_user(email="test@example.com", password="pass123"):
+    # create and return a user
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class ResolveByNameTests(TestCase):
+    # test the upsert based name resolver
+    def setUp(self):
+        self.user = create_user()
+
+    def test_names_unique_per_user(self):
+        # test a user can't have two tags with the same name
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=create_user("other@example.com"), name="Vegan")
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(user=self.user, name="Vegan")
+
+    def test_resolve_existing_and_new(self):
+        # test existing names are reused and missing ones created
+        salt = Ingredient.objects.create(user=self.user, name="Salt")
+
+        with self.assertNumQueries(2):
+            resolved = serializers.resolve_by_name(
+                Ingredient,
+                self.user,
+                ["Salt", "Pepper", "Pepper"],
+            )
+
+        self.assertEqual(resolved["Salt"], salt)
+        pepper = Ingredient.objects.get(user=self.user, name="Pepper")
+        self.assertEqual(resolved["Pepper"], pepper)
+        self.assertEqual(resolved["Pepper"].user, self.user)
+        self.assertFalse(resolved["Pepper"]._state.adding)
+
+    def test_insert_names_skips_conflicts(self):
+        # test inserting existing names is a no-op, not an error
+        Tag.objects.create(user=self.user, name="Vegan")
+
+        inserted = serializers.insert_names(Tag, self.user, ["Vegan", "Thai"])
+
+        self.assertEqual(list(inserted), ["Thai"])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_resolve_reads_back_raced_names(self):
+        # test names inserted after the SELECT by someone else are returned
+        insert_names = serializers.insert_names
+
+        def racing_insert_names(model, user, names):
+            raced = Tag.objects.create(user=user, name=names[0])
+            self.raced_id = raced.id
+            return insert_names(model, user, names)
+
+        with patch("recipe.serializers.insert_names", racing_insert_names):
+            resolved = serializers.resolve_by_name(
+                Tag,
+                self.user,
+                ["Vegan", "Thai"],
+            )
+
+        self.assertEqual(resolved["Thai"].id, self.raced_id)
+        self.assertEqual(
+            set(Tag.objects.values_list("name", flat=True)),
+            {"Vegan", "Thai"},
+        )
+
+
+class ConcurrentResolveByNameTests(TransactionTestCase):
+    # test concurrent resolvers don't create duplicates
+    def test_concurrent_resolve(self):
+        # test threads resolving the same names share the same rows
+        user = create_user()
+        names = [f"Tag {i}" for i in range(20)]
+        barrier = threading.Barrier(4)
+        results = []
+        errors = []
+
+        def resolve():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    resolved = serializers.resolve_by_name(Tag, user, names)
+                results.append({n: obj.id for n, obj in resolved.items()})
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=resolve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(Tag.objects.count(), len(names))
+        self.assertEqual(len(results), 4)
+        for result in results[1:]:
+            self.assertEqual(result, results[0])
@@ -0,0 +1,189 @@
+"""
+  Tests for the content addressed recipe image storage
+"""
+
+import hashlib
+import io
+import os
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from recipe import images
+from recipe.tests.test_images import MediaRootMixin, encode_image
+
+
+def create_recipe(user, **params):
+    # create and return a sample recipe
+    return Recipe.objects.create(
+        user=user,
+        title="Sample recipe",
+        price=Decimal("5.00"),
+        **params,
+    )
+
+
+class ContentAddressedStorageTests(MediaRootMixin, TestCase):
+    # test storing files by content
+    def setUp(self):
+        super().setUp()
+        self.storage = Recipe._meta.get_field("image").storage
+
+    def test_named_after_content(self):
+        # test files are named after their hash, keeping directory and
+        # extension
+        name = self.storage.save("uploads/recipe/a.JPG", ContentFile(b"x"))
+
+        digest = hashlib.sha256(b"x").hexdigest()
+        self.assertEqual(name, f"uploads/recipe/{digest}.jpg")
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b"x")
+
+    def test_identical_content_stored_once(self):
+        # test identical files share one copy, different ones don't
+        first = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        second = self.storage.save("uploads/recipe/b.jpg", ContentFile(b"x"))
+        other = self.storage.save("uploads/recipe/c.jpg", ContentFile(b"y"))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(
+            sorted(self.storage.listdir("uploads/recipe")[1]),
+            sorted([os.path.basename(first), os.path.basename(other)]),
+        )
+
+    @override_settings(RECIPE_IMAGE_CONTENT_ADDRESSED=False)
+    def test_disabled(self):
+        # test names are kept, and made unique, when the mode is off
+        first = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+        second = self.storage.save("uploads/recipe/a.jpg", ContentFile(b"x"))
+
+        self.assertEqual(first, "uploads/recipe/a.jpg")
+        self.assertNotEqual(first, second)
+
+
+@override_settings(
+    RECIPE_IMAGE_VARIANTS_EAGER=True,
+    RECIPE_IMAGE_VARIANT_WIDTHS=[64],
+    RECIPE_IMAGE_VARIANT_FORMATS=["webp"],
+)
+class SharedImageApiTests(MediaRootMixin, TestCase):
+    # test recipes uploading identical images
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipes = [create_recipe(self.user) for _ in range(2)]
+        self.storage = Recipe._meta.get_field("image").storage
+
+    def upload(self, recipe, data):
+        # upload data as the image of recipe
+        image_file = io.BytesIO(data)
+        image_file.name = "photo.jpg"
+        url = reverse("recipe:recipe-upload-image", args=[recipe.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                url,
+                {"image": image_file},
+                format="multipart",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        return images.file_names(recipe)
+
+    def test_files_shared(self):
+        # test recipes with the same image share its files
+        data = encode_image((128, 128))
+        names = self.upload(self.recipes[0], data)
+
+        self.assertEqual(self.upload(self.recipes[1], data), names)
+        self.assertEqual(len(names), 2)
+        self.assertEqual(len(self.storage.listdir("uploads/recipe")[1]), 2)
+
+    def test_files_deleted_with_last_reference(self):
+        # test shared files outlive all but the last recipe using them
+        data = encode_image((128, 128))
+        names = self.upload(self.recipes[0], data)
+        self.upload(self.recipes[1], data)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[0].delete()
+        for name in names:
+            self.assertTrue(self.storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipes[1].delete()
+        for name in names:
+            self.assertFalse(self.storage.exists(name))
+
+    def test_replaced_image_released(self):
+        # test a new upload deletes the files only the old image used
+        shared = self.upload(self.recipes[0], encode_image((128, 128)))
+        self.upload(self.recipes[1], encode_image((128, 128)))
+
+        replaced = self.upload(self.recipes[0], encode_image((96, 48)))
+
+        for name in shared + replaced:
+            self.assertTrue(self.storage.exists(name))
+        self.upload(self.recipes[1], encode_image((96, 48)))
+        for name in shared:
+            self.assertFalse(self.storage.exists(name))
+
+
+class DedupeRecipeImagesTests(MediaRootMixin, TestCase):
+    # test deduplicating files stored under unique names
+    def test_dedupe(self):
+        # test duplicates are renamed to one shared file, others deleted
+        plain = FileSystemStorage()
+        data = encode_image((40, 40))
+        recipes = []
+        for i in range(3):
+            name = plain.save(f"uploads/recipe/{i}.jpg", ContentFile(data))
+            variant = plain.save(
+                f"uploads/recipe/{i}-20w.webp",
+                ContentFile(b"variant"),
+            )
+            recipes.append(
+                create_recipe(
+                    self.user,
+                    image=name,
+                    image_variants=[{"format": "webp", "name": variant}],
+                )
+            )
+        unique = plain.save("uploads/recipe/u.jpg", ContentFile(b"other"))
+        recipes.append(create_recipe(self.user, image=unique))
+
+        out = io.StringIO()
+        call_command("dedupe_recipe_images", stdout=out)
+
+        for recipe in recipes:
+            recipe.refresh_from_db()
+        self.assertEqual(len({r.image.name for r in recipes[:3]}), 1)
+        self.assertEqual(
+            len({r.image_variants[0]["name"] for r in recipes[:3]}),
+            1,
+        )
+        self.assertEqual(
+            sorted(plain.listdir("uploads/recipe")[1]),
+            sorted(
+                os.path.basename(name)
+                for name in images.file_names(recipes[0])
+                + images.file_names(recipes[3])
+            ),
+        )
+        self.assertIn("deleted 7 duplicate file(s)", out.getvalue())
+
+        # already content addressed files are left alone
+        out = io.StringIO()
+        call_command("dedupe_recipe_images", stdout=out)
+        self.assertIn("Renamed the files of 0 recipe(s)", out.getvalue())
@@ -16,6 +16,7 @@ from core.models import Tag, Recipe
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse("recipe:tag-list")
+AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 
 def detail_url(tag_id):
@@ -88,6 +89,19 @@ class PrivateTestApiTest(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload["name"])
 
+    def test_update_tag_duplicate_name(self):
+        # test renaming a tag to one of the user's other tags is rejected
+        Tag.objects.create(user=self.user, name="Dinner")
+        tag = Tag.objects.create(user=self.user, name="After Dinner")
+        other_user = create_user(email="other@example.com")
+        Tag.objects.create(user=other_user, name="Dessert")
+
+        res = self.client.patch(detail_url(tag.id), {"name": "Dinner"})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.patch(detail_url(tag.id), {"name": "Dessert"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_delete_tag(self):
         # test deleting a tag
         tag = Tag.objects.create(user=self.user, name="Tag")
@@ -143,3 +157,38 @@ class PrivateTestApiTest(TestCase):
         res = self.client.get(TAGS_URL, {"assigned_only": 1})
 
         self.assertEqual(len(res.data), 1)
+
+    def test_filter_tags_min_usage_with_assigned_only(self):
+        # test min_usage takes precedence over assigned_only
+        tag1 = Tag.objects.create(user=self.user, name="Breakfast")
+        tag2 = Tag.objects.create(user=self.user, name="Lunch")
+        for i in range(2):
+            recipe = Recipe.objects.create(
+                title=f"Recipe {i}",
+                price=Decimal("1.00"),
+                user=self.user,
+            )
+            recipe.tags.add(tag1)
+        recipe.tags.add(tag2)
+
+        params = {"assigned_only": 1, "min_usage": 2}
+        res = self.client.get(TAGS_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t["id"] for t in res.data], [tag1.id])
+
+    def test_autocomplete_tags(self):
+        # test autocomplete returns the user's tags starting with q
+        Tag.objects.create(user=self.user, name="Vegan")
+        Tag.objects.create(user=self.user, name="vegetarian")
+        Tag.objects.create(user=self.user, name="Dessert")
+        other_user = create_user(email="other@example.com")
+        Tag.objects.create(user=other_user, name="Vegan")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "VEG"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [t["name"] for t in res.data],
+            ["Vegan", "vegetarian"],
+        )
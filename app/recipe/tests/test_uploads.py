@@ -0,0 +1,244 @@
+"""
+  Tests for the bounded recipe image uploads
+"""
+
+import io
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+import types
+import zlib
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile,
+    TemporaryUploadedFile,
+)
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import reverse
+
+from rest_framework import serializers, status
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from core.models import Recipe
+
+from recipe import uploads
+
+# validate_image on a large JPEG in a fresh interpreter, printing the
+# growth of its peak RSS in KB
+VALIDATE_SCRIPT = """
+import resource, sys
+import django
+from django.conf import settings
+settings.configure(
+    RECIPE_IMAGE_FORMATS=["JPEG"],
+    RECIPE_IMAGE_MAX_BYTES=2 ** 30,
+    RECIPE_IMAGE_MAX_PIXELS=10 ** 9,
+)
+django.setup()
+from recipe.uploads import validate_image
+with open(sys.argv[1], "rb") as upload:
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    validate_image(upload)
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(after - before)
+"""
+
+
+def encode_image(size, image_format="JPEG"):
+    # return the bytes of a new image
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def png_header(width, height):
+    # return a PNG claiming width x height pixels, with no pixel data
+    def chunk(kind, data):
+        crc = zlib.crc32(kind + data)
+        return struct.pack(">I", len(data)) + kind + data + (
+            struct.pack(">I", crc)
+        )
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IEND", b"")
+
+
+def validate(data, name="photo.jpg"):
+    # run data through the upload field and return the validated file
+    return uploads.BoundedImageField().to_internal_value(
+        SimpleUploadedFile(name, data),
+    )
+
+
+class ValidateImageTests(SimpleTestCase):
+    # test checking uploaded images from their header
+    def test_valid_image(self):
+        # test a valid image is accepted and rewound
+        upload = validate(encode_image((40, 30)))
+
+        self.assertEqual(upload.tell(), 0)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels(self):
+        # test images over the pixel limit are rejected
+        with self.assertRaisesMessage(serializers.ValidationError, "101x100"):
+            validate(encode_image((101, 100)))
+
+    def test_decompression_bomb(self):
+        # test headers claiming a huge image are rejected without decoding
+        for size in [(12000, 12000), (100000, 100000)]:
+            with self.subTest(size=size):
+                with self.assertRaises(serializers.ValidationError):
+                    validate(png_header(*size), name="bomb.png")
+
+    def test_unsupported_format(self):
+        # test formats other than RECIPE_IMAGE_FORMATS are rejected
+        with self.assertRaisesMessage(serializers.ValidationError, "GIF"):
+            validate(encode_image((10, 10), "GIF"), name="photo.gif")
+
+    def test_corrupted_image(self):
+        # test truncated images and non images are rejected
+        data = encode_image((200, 200))
+        for payload in [data[: len(data) // 2], b"notanimage"]:
+            with self.subTest(size=len(payload)):
+                with self.assertRaises(serializers.ValidationError):
+                    validate(payload)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_too_many_bytes(self):
+        # test files over the byte limit are rejected
+        with self.assertRaises(uploads.UploadTooLarge):
+            validate(b"\0" * 1001)
+
+    def test_jpeg_decoded_in_draft_mode(self):
+        # test validating a JPEG of 108MB of pixels grows the RSS by far
+        # less than that
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as image_file:
+            image = Image.new("RGB", (6000, 6000), "red")
+            image.save(image_file, format="JPEG")
+            del image
+            image_file.flush()
+
+            result = subprocess.run(
+                [sys.executable, "-c", VALIDATE_SCRIPT, image_file.name],
+                capture_output=True,
+                check=True,
+                cwd=os.path.dirname(os.path.dirname(uploads.__file__)),
+                text=True,
+            )
+
+        self.assertLess(int(result.stdout), 20 * 2 ** 10)
+
+
+class BoundedMultiPartParserTests(SimpleTestCase):
+    # test streaming multipart bodies through the parser
+    def parse(self, body_file, length):
+        # parse the multipart body in body_file
+        request = types.SimpleNamespace(
+            META={"CONTENT_LENGTH": str(length)},
+        )
+        return uploads.BoundedMultiPartParser().parse(
+            body_file,
+            MULTIPART_CONTENT,
+            {"request": request},
+        )
+
+    def test_memory_bounded(self):
+        # test an 8MB upload is streamed to disk holding under 1MB
+        size = 8 * 2 ** 20
+        with tempfile.TemporaryFile() as body_file:
+            body_file.write(
+                encode_multipart(
+                    BOUNDARY,
+                    {"image": SimpleUploadedFile("big.jpg", os.urandom(size))},
+                )
+            )
+            length = body_file.tell()
+            body_file.seek(0)
+
+            tracemalloc.start()
+            try:
+                parsed = self.parse(body_file, length)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        upload = parsed.files["image"]
+        self.addCleanup(upload.close)
+        self.assertIsInstance(upload, TemporaryUploadedFile)
+        self.assertEqual(upload.size, size)
+        self.assertLess(peak, 2 ** 20)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_stops_reading_over_limit(self):
+        # test uploads over the limit are rejected with a short body
+        body = encode_multipart(
+            BOUNDARY,
+            {"image": SimpleUploadedFile("big.jpg", b"\0" * 5000)},
+        )
+
+        with self.assertRaises(uploads.UploadTooLarge):
+            self.parse(io.BytesIO(body), len(body))
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_rejects_content_length_over_limit(self):
+        # test bodies announced as too large aren't read at all
+        body = io.BytesIO()
+
+        with self.assertRaises(uploads.UploadTooLarge):
+            self.parse(body, 1000 + uploads.MULTIPART_OVERHEAD + 1)
+        self.assertEqual(body.tell(), 0)
+
+
+class BoundedUploadApiTests(TestCase):
+    # test the limits through the upload API
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="upload@example.com",
+            password="pass123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            price=Decimal("5.00"),
+        )
+        self.url = reverse("recipe:recipe-upload-image", args=[self.recipe.id])
+
+    def upload(self, data, name="photo.jpg"):
+        # post data as the recipe image
+        image_file = io.BytesIO(data)
+        image_file.name = name
+        return self.client.post(
+            self.url,
+            {"image": image_file},
+            format="multipart",
+        )
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1000)
+    def test_upload_too_large(self):
+        # test uploads over the byte limit get a 413
+        res = self.upload(os.urandom(40000))
+
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        )
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_bomb(self):
+        # test decompression bombs get a 400
+        res = self.upload(png_header(100000, 100000), name="bomb.png")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", res.data)
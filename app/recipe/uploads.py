@@ -0,0 +1,148 @@
+"""
+  Bounded memory handling of recipe image uploads
+"""
+
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import (
+    StopUpload,
+    TemporaryFileUploadHandler,
+)
+from django.http.multipartparser import (
+    MultiPartParser as DjangoMultiPartParser,
+    MultiPartParserError,
+)
+
+from PIL import Image
+
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+# room left for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 16 * 2 ** 10
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload too large."
+    default_code = "upload_too_large"
+
+
+def _too_large():
+    # return the error raised for uploads over the byte limit
+    return UploadTooLarge(
+        f"Upload too large, at most {settings.RECIPE_IMAGE_MAX_BYTES} "
+        "bytes are accepted."
+    )
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Stream uploaded files to temporary files, up to max_bytes in all.
+
+    Unlike Django's default handlers, small files aren't kept in memory
+    either, so a request never holds more than one chunk of file data.
+    """
+
+    chunk_size = 64 * 2 ** 10
+
+    def __init__(self, *args, max_bytes, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_bytes = max_bytes
+        self.received = 0
+        self.exceeded = False
+
+    def receive_data_chunk(self, raw_data, start):
+        # stop reading the upload as soon as it goes over the limit
+        self.received += len(raw_data)
+        if self.received > self.max_bytes:
+            self.exceeded = True
+            raise StopUpload()
+
+        return super().receive_data_chunk(raw_data, start)
+
+
+class BoundedMultiPartParser(MultiPartParser):
+    """Multipart parser streaming files through a BoundedUploadHandler"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        request = parser_context["request"]
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        max_bytes = settings.RECIPE_IMAGE_MAX_BYTES
+
+        # reject bodies announced as too large without reading them
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+        if content_length > max_bytes + MULTIPART_OVERHEAD:
+            raise _too_large()
+
+        meta = request.META.copy()
+        meta["CONTENT_TYPE"] = media_type
+        handler = BoundedUploadHandler(max_bytes=max_bytes)
+        try:
+            parser = DjangoMultiPartParser(meta, stream, [handler], encoding)
+            data, files = parser.parse()
+        except MultiPartParserError as exc:
+            raise ParseError(f"Multipart form parse error - {exc}")
+
+        if handler.exceeded:
+            raise _too_large()
+        return DataAndFiles(data, files)
+
+
+def validate_image(upload):
+    """Check an uploaded image from its header, with bounded memory.
+
+    The format, dimensions and pixel count are read from the header
+    without decoding the image. JPEGs are then decoded in draft mode at
+    1/8 scale and other formats verified without decoding, so a corrupt
+    image is rejected without ever holding the full size pixels.
+    """
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns below twice its own pixel limit
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            with Image.open(upload) as image:
+                if image.format not in settings.RECIPE_IMAGE_FORMATS:
+                    raise serializers.ValidationError(
+                        f"Unsupported image format {image.format}."
+                    )
+
+                width, height = image.size
+                if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+                    raise serializers.ValidationError(
+                        f"Image too large, {width}x{height} is over "
+                        f"{settings.RECIPE_IMAGE_MAX_PIXELS} pixels."
+                    )
+
+                if image.format == "JPEG":
+                    image.draft("RGB", (width // 8 or 1, height // 8 or 1))
+                    image.load()
+                else:
+                    image.verify()
+    except (
+        Image.DecompressionBombError,
+        Image.DecompressionBombWarning,
+        OSError,
+        SyntaxError,
+        ValueError,
+    ):
+        raise serializers.ValidationError(
+            "Upload a valid image. The file you uploaded was either not an "
+            "image or a corrupted image."
+        )
+    finally:
+        upload.seek(0)
+
+
+class BoundedImageField(serializers.FileField):
+    """File field accepting images within the configured limits"""
+
+    def to_internal_value(self, data):
+        upload = super().to_internal_value(data)
+        if upload.size > settings.RECIPE_IMAGE_MAX_BYTES:
+            raise _too_large()
+
+        validate_image(upload)
+        return upload
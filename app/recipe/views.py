@@ -2,6 +2,21 @@
   Views for the recipe APIs
 """
 
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    prefetch_related_objects,
+)
+from django.db.models.functions import Cast, Coalesce, Collate, Upper
+from django.http import StreamingHttpResponse
+
 from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
@@ -9,19 +24,63 @@ from drf_spectacular.utils import (
     OpenApiTypes,
 )
 
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework import viewsets, mixins, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 
 from core.models import Ingredient, Recipe, Tag
-from recipe import serializers
+from recipe import images, media, resize, serializers
+from recipe.cache import (
+    CachedListMixin,
+    ConditionalGetMixin,
+    normalize_flag,
+    normalize_ids,
+)
+from recipe.pagination import RecipeCursorPagination
+from recipe.uploads import BoundedMultiPartParser
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+
+
+def int_param(request, name, default):
+    # return the integer query parameter name, or default when missing
+    value = request.query_params.get(name, default)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({name: "A valid integer is required."})
+
+
+def flag_param(request, name):
+    # return the 0/1 query parameter name as a bool, False when missing
+    return bool(int_param(request, name, 0))
+
+
+def recipe_links(field):
+    # return the through model of a Recipe m2m field, with the names of
+    # its recipe and related object id columns
+    m2m = Recipe._meta.get_field(field)
+    return (
+        m2m.remote_field.through,
+        f"{m2m.m2m_field_name()}_id",
+        f"{m2m.m2m_reverse_field_name()}_id",
+    )
 
 
 @extend_schema_view(
     list=extend_schema(
         parameters=[
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                description="Full-text search over title and description, "
+                "results are ordered by relevance",
+            ),
             OpenApiParameter(
                 "tags",
                 OpenApiTypes.STR,
@@ -32,42 +91,166 @@ from recipe import serializers
                 OpenApiTypes.STR,
                 description="Comma separated list of IDs to filter",
             ),
+            OpenApiParameter(
+                "match",
+                OpenApiTypes.STR,
+                enum=["any", "all"],
+                description="Return recipes having any (default) or all of "
+                "the given tags and ingredients",
+            ),
+            OpenApiParameter(
+                "stream",
+                OpenApiTypes.INT,
+                enum=[0, 1],
+                description="Stream every matching recipe as one JSON array",
+            ),
         ]
-    )
+    ),
+    resized_image=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "w",
+                OpenApiTypes.INT,
+                description="Width in pixels, rounded up to the nearest "
+                "allowed width, never wider than the original image",
+            ),
+            OpenApiParameter(
+                "fmt",
+                OpenApiTypes.STR,
+                enum=list(images.FORMATS),
+                description="Image format, webp by default when the server "
+                "can encode it, jpeg otherwise",
+            ),
+        ],
+        responses={
+            (200, "application/octet-stream"): OpenApiTypes.BINARY,
+            304: None,
+        },
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
+    viewsets.ModelViewSet,
+):
     """Recipe viewset to manages Recipe APIs"""
 
     serializer_class = serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    cache_query_params = {
+        "q": str,
+        "tags": normalize_ids,
+        "ingredients": normalize_ids,
+        "match": str,
+        "cursor": str,
+        "page_size": str,
+    }
+
+    # related objects to load up front for each action, so the nested
+    # tag/ingredient serializers don't issue a query per recipe
+    prefetch_plans = {
+        "list": ["tags", "ingredients"],
+        "retrieve": ["tags", "ingredients"],
+        "upload_image": [],
+        "resized_image": [],
+    }
+    # number of recipes fetched from the server-side cursor per chunk
+    # when streaming the list
+    stream_chunk_size = 200
+    # largest number of recipes accepted by a single bulk create
+    bulk_create_max_items = 500
+    # text search configuration matching the search_vector trigger
+    search_config = "english"
 
     def _params_to_ints(self, qs):
         """Convert a list of string IDs to a list of integers"""
         return [int(str_id) for str_id in qs.split(",")]
 
+    def get_prefetch_plan(self):
+        # return the related lookups to prefetch for the current action
+        return self.prefetch_plans.get(self.action, [])
+
+    def get_match_mode(self):
+        # return how the tags/ingredients filters combine their IDs
+        match = self.request.query_params.get("match", "any")
+        if match not in ("any", "all"):
+            raise ValidationError({"match": 'Must be "any" or "all".'})
+
+        return match
+
+    def _filter_related(self, queryset, field, ids, match):
+        # keep recipes linked to any/all of ids through the m2m field,
+        # querying the through table instead of joining it
+        through, source, target = recipe_links(field)
+        links = through.objects.filter(**{f"{target}__in": ids})
+
+        if match == "all":
+            # recipes linked to as many of the IDs as were asked for
+            matching = (
+                links.values(source)
+                .annotate(matched=Count(target))
+                .filter(matched=len(ids))
+                .values(source)
+            )
+            return queryset.filter(id__in=matching)
+
+        linked = links.filter(**{source: OuterRef("pk")})
+        return queryset.filter(Exists(linked))
+
+    def get_search_terms(self):
+        # return the stripped full-text search terms, if any
+        return self.request.query_params.get("q", "").strip()
+
     def get_queryset(self):
         # retrieve the recipes for the authenticated user
         # return self.queryset.filter(user=self.request.user).order_by("-id")
         tags = self.request.query_params.get("tags", None)
         ingredients = self.request.query_params.get("ingredients", None)
+        terms = self.get_search_terms()
+        match = self.get_match_mode()
         queryset = self.queryset
+        ordering = ["-id"]
+
+        if terms:
+            # match against the GIN indexed vector, best matches first
+            query = SearchQuery(
+                terms,
+                config=self.search_config,
+                search_type="websearch",
+            )
+            # ts_rank is a float4, whose decimal form in the cursor doesn't
+            # compare equal to it: rank as a float8, which round-trips
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+            )
+            ordering = ["-rank", "-id"]
 
         if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
+            tag_ids = set(self._params_to_ints(tags))
+            queryset = self._filter_related(queryset, "tags", tag_ids, match)
 
         if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            ingredient_ids = set(self._params_to_ints(ingredients))
+            queryset = self._filter_related(
+                queryset,
+                "ingredients",
+                ingredient_ids,
+                match,
+            )
 
         return (
             queryset.filter(
                 user=self.request.user,
             )
-            .order_by("-id")
-            .distinct()
+            .defer("search_vector")
+            .prefetch_related(*self.get_prefetch_plan())
+            .order_by(*ordering)
         )
 
     def get_serializer_class(self):
@@ -83,18 +266,167 @@ class RecipeViewSet(viewsets.ModelViewSet):
         # create a new recipe
         serializer.save(user=self.request.user)
 
-    @action(methods=["POST"], detail=True, url_path="upload-image")
+    def list(self, request, *args, **kwargs):
+        # list recipes, streaming them unpaginated when asked to
+        if flag_param(request, "stream"):
+            return self.stream_list(request)
+
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        # retrieve a recipe with conditional GET support
+        return self.conditional_response(
+            super().retrieve,
+            request,
+            *args,
+            **kwargs,
+        )
+
+    def stream_list(self, request):
+        # stream every matching recipe as a single JSON array
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            self._render_stream(queryset),
+            content_type="application/json",
+        )
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    def _iter_chunks(self, queryset):
+        # yield lists of recipes read through a server-side cursor
+        chunk = []
+        # iterator() ignores prefetch_related, relations are loaded per chunk
+        rows = queryset.prefetch_related(None).iterator(
+            chunk_size=self.stream_chunk_size,
+        )
+        for recipe in rows:
+            chunk.append(recipe)
+            if len(chunk) == self.stream_chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    def _render_stream(self, queryset):
+        # serialize and render the queryset one chunk at a time
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        renderer = JSONRenderer()
+        separator = b""
+
+        yield b"["
+        for chunk in self._iter_chunks(queryset):
+            prefetch_related_objects(chunk, *self.get_prefetch_plan())
+            data = serializer_class(chunk, many=True, context=context).data
+            # strip the brackets of the rendered chunk to splice it in
+            yield separator + renderer.render(data)[1:-1]
+            separator = b","
+        yield b"]"
+
+    @extend_schema(
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses={
+            201: serializers.RecipeBulkCreateResultSerializer,
+            400: serializers.RecipeBulkCreateResultSerializer,
+        },
+    )
+    @action(methods=["POST"], detail=False, url_path="bulk")
+    def bulk_create(self, request):
+        # Create many recipes in one request, reporting errors per item
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Expected a non-empty list of recipes."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > self.bulk_create_max_items:
+            return Response(
+                {
+                    "detail": "Too many recipes, at most "
+                    f"{self.bulk_create_max_items} per request."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        valid = []
+        errors = []
+        for index, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                errors.append({"index": index, "errors": serializer.errors})
+
+        recipes = serializers.bulk_create_recipes(request.user, valid)
+        result = {
+            "created": self.get_serializer(recipes, many=True).data,
+            "errors": errors,
+        }
+        if recipes:
+            return Response(result, status=status.HTTP_201_CREATED)
+
+        return Response(result, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(
+        methods=["POST"],
+        detail=True,
+        url_path="upload-image",
+        parser_classes=[BoundedMultiPartParser],
+    )
     def upload_image(self, request, pk=None):
         # Upload an image to recipe
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            old_files = images.file_names(recipe)
+            # the new image is written and referenced under one lock, so
+            # a concurrent release of the same content can't delete it
+            with transaction.atomic():
+                # variants of the previous image no longer apply
+                recipe = serializer.save(image_variants=[])
+            images.release_on_commit(old_files)
+            images.schedule_variants(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(
+        methods=["GET"],
+        detail=True,
+        url_path="image",
+        content_negotiation_class=media.IgnoreClientContentNegotiation,
+    )
+    def resized_image(self, request, pk=None):
+        # send the recipe image resized on demand, from the disk cache
+        recipe = self.get_object()
+        if not recipe.image:
+            raise NotFound("The recipe has no image.")
+
+        width = None
+        if "w" in request.query_params:
+            width = int_param(request, "w", None)
+            if width < 1:
+                raise ValidationError({"w": "Must be a positive integer."})
+        formats = images.supported_formats(images.FORMATS)
+        image_format = request.query_params.get("fmt", formats[0])
+        if image_format not in formats:
+            raise ValidationError(
+                {"fmt": f"Must be one of {', '.join(formats)}."}
+            )
+
+        args = (recipe.image.name, resize.snap_width(width), image_format)
+        name, path = resize.resized_image(*args)
+        # the URL names the recipe, not its image, so clients revalidate
+        try:
+            return media.file_response(request, name, path, immutable=False)
+        except FileNotFoundError:
+            # evicted by another process since it was looked up, render
+            # it again
+            name, path = resize.resized_image(*args)
+            return media.file_response(request, name, path, immutable=False)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -105,10 +437,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 enum=[0, 1],
                 description="Filter by items assigned to recipes",
             ),
+            OpenApiParameter(
+                "min_usage",
+                OpenApiTypes.INT,
+                description="Filter by items used by at least this many "
+                "recipes",
+            ),
+            OpenApiParameter(
+                "with_recipe_count",
+                OpenApiTypes.INT,
+                enum=[0, 1],
+                description="Include the number of recipes using each item",
+            ),
+            OpenApiParameter(
+                "ordering",
+                OpenApiTypes.STR,
+                enum=["-name", "name", "-recipe_count", "recipe_count"],
+                description="Order by name (default -name) or by usage",
+            ),
         ]
     )
 )
 class BaseRecipeAttrViewSet(
+    ConditionalGetMixin,
+    CachedListMixin,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -116,24 +468,115 @@ class BaseRecipeAttrViewSet(
 ):
     """Base viewset for recipe attributes"""
 
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
     permission_classes = [IsAuthenticated]
+    cache_query_params = {
+        "assigned_only": normalize_flag,
+        "min_usage": str,
+        "with_recipe_count": normalize_flag,
+        "ordering": str,
+    }
+    orderings = ["-name", "name", "-recipe_count", "recipe_count"]
+    # Recipe m2m field linking recipes to these items
+    recipe_field = None
+    # default and largest number of autocomplete suggestions
+    autocomplete_limit = 10
+    autocomplete_max_limit = 50
+
+    def get_ordering(self):
+        # return the requested ordering of the list
+        ordering = self.request.query_params.get("ordering", "-name")
+        if ordering not in self.orderings:
+            raise ValidationError(
+                {"ordering": f"Must be one of {', '.join(self.orderings)}."}
+            )
+
+        return ordering
 
     def get_queryset(self):
-        assigned_only = bool(
-            int(self.request.query_params.get("assigned_only", 0)),
-        )
+        assigned_only = flag_param(self.request, "assigned_only")
+        min_usage = int_param(self.request, "min_usage", 0)
+        with_recipe_count = flag_param(self.request, "with_recipe_count")
+        ordering = self.get_ordering()
+        by_usage = ordering.endswith("recipe_count")
         queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
+        through, source, target = recipe_links(self.recipe_field)
+        links = through.objects.filter(**{target: OuterRef("pk")})
 
-        return (
-            queryset.filter(
-                user=self.request.user,
+        # every usage filter, count and ordering only reads the through
+        # table's index on the item column, so they cost one index probe
+        # per item instead of a join over every link followed by DISTINCT
+        if with_recipe_count or by_usage or min_usage > 1:
+            # count the links per item in a correlated subquery, selected
+            # only when the count is returned
+            usage = (
+                links.values(target)
+                .annotate(count=Count("*"))
+                .values("count")
+            )
+            recipe_count = Coalesce(
+                Subquery(usage, output_field=IntegerField()),
+                0,
             )
-            .order_by("-name")
-            .distinct()
+            if with_recipe_count:
+                queryset = queryset.annotate(recipe_count=recipe_count)
+            else:
+                queryset = queryset.alias(recipe_count=recipe_count)
+
+        if min_usage > 1:
+            queryset = queryset.filter(recipe_count__gte=min_usage)
+        elif assigned_only or min_usage == 1:
+            # stop at the first link
+            queryset = queryset.filter(Exists(links))
+
+        # usage ties are listed by name
+        ordering = [ordering, "name"] if by_usage else [ordering]
+        return queryset.filter(
+            user=self.request.user,
+        ).order_by(*ordering)
+
+    def _get_autocomplete_limit(self):
+        # return the requested number of suggestions, capped
+        limit = int_param(self.request, "limit", self.autocomplete_limit)
+        return max(1, min(limit, self.autocomplete_max_limit))
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                OpenApiTypes.STR,
+                description="Case insensitive prefix of the name, "
+                "matched exactly, without typo tolerance",
+            ),
+            OpenApiParameter(
+                "limit",
+                OpenApiTypes.INT,
+                description="Number of suggestions, at most 50",
+            ),
+        ],
+    )
+    @action(methods=["GET"], detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        # suggest the user's items whose name starts with q
+        prefix = request.query_params.get("q", "").strip()
+        if not prefix:
+            return Response([])
+
+        # the expression matches the (user, name prefix) index, so the
+        # lookup and ordering are one index range scan stopped at the limit;
+        # a pg_trgm index would also match typos, but returns its matches
+        # unordered, so the top N would cost a sort of every match
+        queryset = (
+            self.queryset.filter(user=request.user)
+            .annotate(name_key=Collate(Upper("name"), "C"))
+            .filter(name_key__startswith=prefix.upper())
+            .order_by("name_key", "id")[: self._get_autocomplete_limit()]
         )
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -141,6 +584,7 @@ class TagViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.TagSerializer
     queryset = Tag.objects.all()
+    recipe_field = "tags"
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
@@ -148,3 +592,4 @@ class IngredientViewSet(BaseRecipeAttrViewSet):
 
     serializer_class = serializers.IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = "ingredients"
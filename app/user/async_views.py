@@ -0,0 +1,59 @@
+"""
+  Async entry points for the user api, used when served over ASGI
+
+Under ASGI, Django runs every sync view on one shared thread, so a login
+spending hundreds of milliseconds in PBKDF2 holds up every other request.
+These views run the hashing-heavy user views on a dedicated, bounded pool
+instead and answer 503 when it is saturated.
+"""
+
+import asyncio
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+
+from user import views
+from user.hashing import PoolSaturated, get_hashing_pool
+
+
+def _run_view(view, request, args, kwargs):
+    # run a sync view to completion on a pool thread
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, "render") and callable(response.render):
+            response = response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offload(view):
+    # wrap a sync view so it runs on the password hashing pool
+    async def async_view(request, *args, **kwargs):
+        try:
+            future = get_hashing_pool().submit(
+                _run_view,
+                view,
+                request,
+                args,
+                kwargs,
+            )
+        except PoolSaturated:
+            response = JsonResponse(
+                {"detail": "Too many authentication requests, retry later."},
+                status=503,
+            )
+            response["Retry-After"] = str(settings.AUTH_HASHING_RETRY_AFTER)
+            return response
+
+        return await asyncio.wrap_future(future)
+
+    # csrf_exempt() can't wrap coroutines before Django 5.0
+    async_view.csrf_exempt = True
+    return async_view
+
+
+create_user = offload(views.CreateUserView.as_view())
+create_token = offload(views.CreateTokenView.as_view())
@@ -0,0 +1,64 @@
+"""
+  Bounded worker pool for password hashing
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+class PoolSaturated(Exception):
+    """Raised when every worker is busy and the queue is full"""
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor accepting at most `max_workers + queue_size` jobs.
+
+    Submitting past that limit raises PoolSaturated instead of queueing
+    without bound, so callers can shed load early.
+    """
+
+    def __init__(self, max_workers, queue_size, thread_name_prefix=""):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=thread_name_prefix,
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + queue_size)
+
+    def submit(self, fn, *args, **kwargs):
+        # schedule fn(*args, **kwargs), or raise PoolSaturated when full
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated()
+
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    # return the process-wide pool running password hashing views
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BoundedExecutor(
+                max_workers=settings.AUTH_HASHING_WORKERS,
+                queue_size=settings.AUTH_HASHING_QUEUE_SIZE,
+                thread_name_prefix="auth-hashing",
+            )
+
+    return _pool
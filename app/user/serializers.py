@@ -3,9 +3,12 @@
 """
 
 from django.contrib.auth import get_user_model, authenticate
+from django.core import signing
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from user.tokens import read_refresh_token
+
 
 class UserSerializer(serializers.ModelSerializer):
     # Serializer for the user object
@@ -35,6 +38,11 @@ class AuthTokenSerializer(serializers.Serializer):
     password = serializers.CharField(
         style={"input_type": "password"}, trim_whitespace=False
     )
+    signed = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Also issue signed access and refresh tokens",
+    )
 
     def validate(self, attrs):
         # Validate and authenticate the user
@@ -52,3 +60,27 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    # Serializer exchanging a refresh token for new signed tokens
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        # Validate the refresh token and load its user
+        try:
+            attrs["user"] = read_refresh_token(attrs["refresh"])
+        except signing.BadSignature:
+            msg = _("Invalid or expired refresh token")
+            raise serializers.ValidationError(msg, code="authorization")
+
+        return attrs
+
+
+class TokenCacheStatsSerializer(serializers.Serializer):
+    # Serializer for the token cache counters of one server process
+    process = serializers.IntegerField()
+    hits = serializers.IntegerField()
+    misses = serializers.IntegerField()
+    evictions = serializers.IntegerField()
+    size = serializers.IntegerField()
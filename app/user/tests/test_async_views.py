@@ -0,0 +1,113 @@
+"""
+Tests for the ASGI entry points of the user api
+"""
+
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import (
+    AsyncClient,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from rest_framework import status
+
+from user import async_views
+from user.hashing import BoundedExecutor, PoolSaturated
+
+TOKEN_PATH = "/api/user/token/"
+CREATE_USER_PATH = "/api/user/create/"
+
+
+@override_settings(ROOT_URLCONF="app.asgi_urls")
+class AsyncUserApiTests(TransactionTestCase):
+    # test the user api served through the hashing pool
+    def setUp(self):
+        self.client = AsyncClient()
+
+    def post(self, path, payload):
+        # post a JSON payload through the ASGI handler
+        async def request():
+            return await self.client.post(
+                path,
+                payload,
+                content_type="application/json",
+            )
+
+        return async_to_sync(request)()
+
+    def test_create_user(self):
+        # test creating a user through the async view
+        payload = {
+            "email": "test@example.com",
+            "password": "pass123",
+            "name": "Test name",
+        }
+
+        res = self.post(CREATE_USER_PATH, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn("password", res.json())
+        user = get_user_model().objects.get(email=payload["email"])
+        self.assertTrue(user.check_password(payload["password"]))
+
+    def test_create_token(self):
+        # test logging in through the async view runs on the pool
+        get_user_model().objects.create_user(
+            email="test@example.com",
+            password="pass123",
+        )
+        thread_names = []
+        run_view = async_views._run_view
+
+        def recording_run_view(*args):
+            thread_names.append(threading.current_thread().name)
+            return run_view(*args)
+
+        payload = {"email": "test@example.com", "password": "pass123"}
+        with patch("user.async_views._run_view", recording_run_view):
+            res = self.post(TOKEN_PATH, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("token", res.json())
+        self.assertTrue(thread_names[0].startswith("auth-hashing"))
+
+    def test_saturated_pool_rejected(self):
+        # test requests are shed with 503 when the pool is full
+        pool = BoundedExecutor(max_workers=1, queue_size=0)
+        pool._slots.acquire()
+        payload = {"email": "test@example.com", "password": "pass123"}
+
+        with patch("user.async_views.get_hashing_pool", return_value=pool):
+            res = self.post(TOKEN_PATH, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res["Retry-After"], "1")
+
+
+class BoundedExecutorTests(SimpleTestCase):
+    # test the bounded executor
+    def test_rejects_past_capacity(self):
+        # test submitting past workers + queue raises PoolSaturated
+        pool = BoundedExecutor(max_workers=1, queue_size=1)
+        release = threading.Event()
+        futures = [pool.submit(release.wait) for _ in range(2)]
+
+        with self.assertRaises(PoolSaturated):
+            pool.submit(release.wait)
+
+        release.set()
+        for future in futures:
+            future.result()
+        pool.shutdown()
+
+    def test_slots_freed_when_done(self):
+        # test finished jobs free their slot
+        pool = BoundedExecutor(max_workers=1, queue_size=0)
+        for i in range(3):
+            self.assertEqual(pool.submit(lambda: i).result(), i)
+        pool.shutdown()
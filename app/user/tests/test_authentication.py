@@ -0,0 +1,156 @@
+"""
+Tests for the cached token authentication
+"""
+
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TokenCache, token_cache
+
+ME_URL = reverse("user:me")
+TOKEN_CACHE_URL = reverse("user:token-cache")
+
+
+def create_user(**params):
+    # create and return a new user
+    return get_user_model().objects.create_user(**params)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    # test authenticating with a cached token lookup
+    def setUp(self):
+        token_cache.clear()
+        self.user = create_user(
+            email="test@example.com",
+            password="pass123",
+            name="Test Name",
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_token_lookup_cached(self):
+        # test the second request doesn't query the token table
+        self.client.get(ME_URL)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(token_cache.stats()["hits"], 1)
+        self.assertEqual(token_cache.stats()["misses"], 1)
+
+    def test_stats_for_admins(self):
+        # test admins can read the cache counters of the process
+        self.client.get(ME_URL)
+        self.user.is_staff = True
+        self.user.save()
+
+        res = self.client.get(TOKEN_CACHE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["misses"], 2)
+        self.assertIn("process", res.data)
+
+    def test_stats_not_for_users(self):
+        # test other users can't read the cache counters
+        res = self.client.get(TOKEN_CACHE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_token_rejected(self):
+        # test an unknown token is rejected and not cached
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(token_cache.stats()["size"], 0)
+
+    def test_deleted_token_invalidated(self):
+        # test deleting a token stops it from authenticating
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        # test deactivating a user stops their token from authenticating
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_update_through_me_invalidated(self):
+        # test changes made through the me endpoint are seen next request
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"name": "Updated name"})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["name"], "Updated name")
+
+    def test_expired_entry_reloaded(self):
+        # test entries older than the TTL are looked up again
+        self.client.get(ME_URL)
+
+        with patch("user.authentication.time.monotonic") as mock_monotonic:
+            mock_monotonic.return_value = 10 ** 9
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(token_cache.stats()["misses"], 2)
+
+
+class TokenCacheTests(TestCase):
+    # test the token LRU cache
+    def setUp(self):
+        self.users = [
+            create_user(email=f"test{i}@example.com", password="pass123")
+            for i in range(3)
+        ]
+
+    def test_least_recently_used_evicted(self):
+        # test the least recently used entry is evicted when full
+        cache = TokenCache(maxsize=2, ttl=60)
+        cache.set("a", (self.users[0], None))
+        cache.set("b", (self.users[1], None))
+        cache.get("a")
+
+        cache.set("c", (self.users[2], None))
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_invalidate_user(self):
+        # test invalidating a user drops all of their tokens
+        cache = TokenCache(maxsize=10, ttl=60)
+        cache.set("a", (self.users[0], None))
+        cache.set("b", (self.users[0], None))
+        cache.set("c", (self.users[1], None))
+
+        cache.invalidate_user(self.users[0].pk)
+
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
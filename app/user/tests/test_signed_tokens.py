@@ -0,0 +1,186 @@
+"""
+Tests for the signed access and refresh tokens
+"""
+
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+from user import tokens
+
+TOKEN_URL = reverse("user:token")
+REFRESH_URL = reverse("user:token-refresh")
+RECIPE_URL = reverse("recipe:recipe-list")
+
+
+def create_user(**params):
+    # create and return a new user
+    return get_user_model().objects.create_user(**params)
+
+
+class SignedTokenApiTests(TestCase):
+    # test issuing and using signed tokens
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email="test@example.com", password="pass123")
+        self.credentials = {"email": "test@example.com", "password": "pass123"}
+
+    def get_signed_tokens(self):
+        # log in asking for signed tokens
+        payload = dict(self.credentials, signed=True)
+        res = self.client.post(TOKEN_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_default_token_response_unchanged(self):
+        # test existing clients only get the DB token
+        res = self.client.post(TOKEN_URL, self.credentials)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(res.data), ["token"])
+
+    def test_signed_tokens_issued(self):
+        # test signed tokens are issued alongside the DB token
+        data = self.get_signed_tokens()
+
+        self.assertIn("token", data)
+        self.assertIn("access", data)
+        self.assertIn("refresh", data)
+        self.assertEqual(data["expires_in"], 300)
+
+    def test_access_token_without_db_lookup(self):
+        # test recipe reads authenticate without querying for the user
+        Recipe.objects.create(
+            user=self.user,
+            title="Sample recipe",
+            time_minutes=5,
+            price="5.00",
+        )
+        access = self.get_signed_tokens()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+        for query in ctx.captured_queries:
+            self.assertNotIn("core_user", query["sql"])
+            self.assertNotIn("authtoken_token", query["sql"])
+
+    def test_create_recipe_with_access_token(self):
+        # test recipes created with an access token belong to the user
+        access = self.get_signed_tokens()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        payload = {"title": "New", "time_minutes": 5, "price": "1.00"}
+
+        res = self.client.post(RECIPE_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Recipe.objects.get().user, self.user)
+
+    def test_tampered_access_token_rejected(self):
+        # test a modified access token is rejected
+        access = self.get_signed_tokens()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}x")
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_access_token_rejected(self):
+        # test an access token older than its TTL is rejected
+        access = self.get_signed_tokens()["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+
+        with self.settings(SIGNED_TOKEN_ACCESS_TTL=-1):
+            res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_db_token_still_accepted(self):
+        # test the DB token keeps working on the recipe endpoints
+        token = self.get_signed_tokens()["token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_refresh_token(self):
+        # test a refresh token is exchanged for new signed tokens
+        refresh = self.get_signed_tokens()["refresh"]
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            tokens.read_access_token(res.data["access"]).pk,
+            self.user.pk,
+        )
+        self.assertIn("refresh", res.data)
+
+    def test_refresh_revoked_by_password_change(self):
+        # test changing the password revokes refresh tokens
+        refresh = self.get_signed_tokens()["refresh"]
+        self.user.set_password("newpass123")
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_rejected_for_inactive_user(self):
+        # test deactivated users can't refresh
+        refresh = self.get_signed_tokens()["refresh"]
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_access_token_not_a_refresh_token(self):
+        # test access tokens can't be used to refresh
+        access = self.get_signed_tokens()["access"]
+
+        res = self.client.post(REFRESH_URL, {"refresh": access})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SignedTokenTests(TestCase):
+    # test reading signed tokens
+    def test_read_access_token_no_queries(self):
+        # test access tokens are read without the database
+        user = create_user(email="test@example.com", password="pass123")
+        access = tokens.make_access_token(user)
+
+        with self.assertNumQueries(0):
+            token_user = tokens.read_access_token(access)
+
+        self.assertEqual(token_user.pk, user.pk)
+        self.assertEqual(token_user.email, user.email)
+        self.assertTrue(token_user.is_authenticated)
+
+    def test_access_token_expires(self):
+        # test access tokens expire after their TTL
+        user = create_user(email="test@example.com", password="pass123")
+        # signing reads the global time.time, only mock it while signing
+        with patch("django.core.signing.time.time") as mock_time:
+            mock_time.return_value = 1000
+            access = tokens.make_access_token(user)
+
+            mock_time.return_value = 1000 + 301
+            with self.assertRaises(signing.SignatureExpired):
+                tokens.read_access_token(access)
@@ -81,6 +81,21 @@ class PublicUserApiTests(TestCase):
         self.assertIn("token", res.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_create_token_rehashes_password(self):
+        # test logging in upgrades the hash to the configured cost
+        user_details = {"email": "test@example.com", "password": "pass123"}
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=1000):
+            user = create_user(**user_details)
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+        with self.settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            res = self.client.post(TOKEN_URL, user_details)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(user.check_password(user_details["password"]))
+
     def test_create_token_invalid_credentials(self):
         # test that token is not generated for invalid credentials
         user_details = {"email": "test@example.com", "password": "goodpass"}
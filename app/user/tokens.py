@@ -0,0 +1,76 @@
+"""
+  Signed, stateless access and refresh tokens
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.crypto import salted_hmac
+
+ACCESS_SALT = "user.tokens.access"
+REFRESH_SALT = "user.tokens.refresh"
+
+
+def _password_fingerprint(user):
+    # changes whenever the user's password does, revoking refresh tokens
+    return salted_hmac(REFRESH_SALT, user.password).hexdigest()[:16]
+
+
+def make_access_token(user):
+    # return a short-lived access token verifiable without the database
+    return signing.dumps({"uid": user.pk, "email": user.email}, ACCESS_SALT)
+
+
+def make_refresh_token(user):
+    # return a long-lived token that can be exchanged for access tokens
+    return signing.dumps(
+        {"uid": user.pk, "fp": _password_fingerprint(user)},
+        REFRESH_SALT,
+    )
+
+
+def issue_signed_tokens(user):
+    # return a fresh access/refresh token pair for a user
+    return {
+        "access": make_access_token(user),
+        "refresh": make_refresh_token(user),
+        "expires_in": settings.SIGNED_TOKEN_ACCESS_TTL,
+    }
+
+
+def read_access_token(token):
+    # return the user an access token was issued to, without loading it
+    # from the database; raises signing.BadSignature if invalid or expired
+    payload = signing.loads(
+        token,
+        ACCESS_SALT,
+        max_age=settings.SIGNED_TOKEN_ACCESS_TTL,
+    )
+    user = get_user_model()(
+        pk=payload["uid"],
+        email=payload["email"],
+        is_active=True,
+    )
+    # the user was persisted when the token was issued
+    user._state.adding = False
+    user._state.db = "default"
+    return user
+
+
+def read_refresh_token(token):
+    # return the active user a refresh token was issued to; raises
+    # signing.BadSignature if invalid, expired or revoked
+    payload = signing.loads(
+        token,
+        REFRESH_SALT,
+        max_age=settings.SIGNED_TOKEN_REFRESH_TTL,
+    )
+    user = (
+        get_user_model()
+        .objects.filter(pk=payload["uid"], is_active=True)
+        .first()
+    )
+    if user is None or payload["fp"] != _password_fingerprint(user):
+        raise signing.BadSignature("Refresh token revoked")
+
+    return user
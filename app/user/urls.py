@@ -11,5 +11,15 @@ app_name = "user"
 urlpatterns = [
     path("create/", views.CreateUserView.as_view(), name="create"),
     path("token/", views.CreateTokenView.as_view(), name="token"),
+    path(
+        "token/refresh/",
+        views.RefreshTokenView.as_view(),
+        name="token-refresh",
+    ),
     path("me/", views.ManageUserView.as_view(), name="me"),
+    path(
+        "token-cache/",
+        views.TokenCacheStatsView.as_view(),
+        name="token-cache",
+    ),
 ]
@@ -2,11 +2,22 @@
   Views for the user api
 """
 
-from rest_framework import generics, authentication, permissions
+import os
+
+from rest_framework import generics, permissions
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
-from user.serializers import UserSerializer, AuthTokenSerializer
+from user.authentication import CachedTokenAuthentication, token_cache
+from user.serializers import (
+    UserSerializer,
+    AuthTokenSerializer,
+    RefreshTokenSerializer,
+    TokenCacheStatsSerializer,
+)
+from user.tokens import issue_signed_tokens
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -19,13 +30,52 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        # issue the DB token, plus signed tokens when asked for
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data["user"]
+        token, created = Token.objects.get_or_create(user=user)
+
+        data = {"token": token.key}
+        if serializer.validated_data["signed"]:
+            data.update(issue_signed_tokens(user))
+
+        return Response(data)
+
+
+class RefreshTokenView(generics.GenericAPIView):
+    # Exchange a refresh token for new signed tokens
+    serializer_class = RefreshTokenSerializer
+    renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(
+            issue_signed_tokens(serializer.validated_data["user"]),
+        )
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     # Manage the authenticated user
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
         # Retrieve and return authenticated user
         return self.request.user
+
+
+class TokenCacheStatsView(generics.GenericAPIView):
+    # Report the token cache counters of the process answering, to admins
+    serializer_class = TokenCacheStatsSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        # each server process has its own cache, tell them apart by pid
+        stats = {"process": os.getpid(), **token_cache.stats()}
+        return Response(self.get_serializer(stats).data)